@@ -163,6 +163,23 @@ def add_argument_source_only(parser):
         help='Only trigger source jobs')
 
 
+def add_argument_dependency_order(parser):
+    parser.add_argument(
+        '--dependency-order',
+        action='store_true',
+        help='Trigger the jobs of packages after the jobs of their ' +
+             'dependencies')
+
+
+def add_argument_wait_for_waves(parser):
+    parser.add_argument(
+        '--wait-for-waves',
+        action='store_true',
+        help='Wait for the jobs of each wave of packages to finish before ' +
+             'triggering the jobs of the next wave (implies ' +
+             '--dependency-order, not supported with --groovy-script)')
+
+
 def add_argument_os_code_name_and_arch_tuples(parser):
     parser.add_argument(
         '--os-code-name-and-arch-tuples',
@@ -196,3 +213,13 @@ def add_argument_force(parser):
         '--force',
         action='store_true',
         help='Force running the documentation generation')
+
+
+def add_argument_concurrency(parser):
+    from ros_buildfarm.jenkins import DEFAULT_CONCURRENCY
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help='The maximum number of jobs being configured concurrently on '
+             'the Jenkins master (default: %d)' % DEFAULT_CONCURRENCY)
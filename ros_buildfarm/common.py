@@ -1,5 +1,8 @@
+import base64
 from collections import namedtuple
 import os
+import tempfile
+import zlib
 
 
 class JobValidationError(Exception):
@@ -29,6 +32,52 @@ class Scope(object):
         print('# END %s' % self.scope_name)
 
 
+class GroovyJobConfigs(object):
+
+    """
+    Job configs to be embedded into a groovy script.
+
+    The configs are appended to a single gzip stream which is written to a
+    temporary file as the configs are being added.
+    Since consecutive configs only differ in a few values the compression
+    of the stream removes most of the repeated content.
+    The groovy script embeds the stream as base64 encoded chunks.
+    """
+
+    # the number of bytes encoded in each chunk, a multiple of three to
+    # avoid padding and small enough that the encoded chunk stays below the
+    # limit of 65535 bytes for string constants in groovy
+    CHUNK_SIZE = 3 * 15 * 1024
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._compressor = zlib.compressobj(
+            9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, job_name, job_config):
+        # the null character separates the fields since it is valid in
+        # neither job names nor XML documents
+        data = (job_name + '\0' + job_config + '\0').encode('utf-8')
+        self._file.write(self._compressor.compress(data))
+        self._count += 1
+
+    def get_chunks(self):
+        """Finish the stream and get its base64 encoded chunks."""
+        if self._compressor is not None:
+            self._file.write(self._compressor.flush())
+            self._compressor = None
+        self._file.seek(0)
+        while True:
+            data = self._file.read(self.CHUNK_SIZE)
+            if not data:
+                break
+            yield base64.b64encode(data).decode('ascii')
+
+
 Target = namedtuple('Target', 'os_name os_code_name arch')
 
 
@@ -33,62 +33,292 @@
 
 from __future__ import print_function
 
+import copy
+import hashlib
+import json
 import logging
 import os
-import yaml
-
-logger = logging.getLogger('ros_buildfarm.config')
+import pickle
+import threading
+import time
 
 from .doc_build_file import DocBuildFile
 from .index import Index
+from .loader import CACHE_DIR_ENVIRONMENT_VARIABLE
 from .loader import load_url
+from .loader import load_yaml
 from .release_build_file import ReleaseBuildFile
 from .source_build_file import SourceBuildFile
 
+logger = logging.getLogger('ros_buildfarm.config')
+
+# the number of seconds entries of the on-disk cache are being used
+CACHE_MAX_AGE_ENVIRONMENT_VARIABLE = 'ROS_BUILDFARM_CONFIG_CACHE_MAX_AGE'
+DEFAULT_CACHE_MAX_AGE = 600
+
+# the number of seconds unused entries are kept in the on-disk cache
+CACHE_RETENTION_ENVIRONMENT_VARIABLE = 'ROS_BUILDFARM_CONFIG_CACHE_RETENTION'
+DEFAULT_CACHE_RETENTION = 7 * 24 * 60 * 60
+
+# the maximum number of build files being fetched concurrently
+MAX_CONCURRENT_FETCHES = 8
+
+_cache = {}
+_cache_lock = threading.Lock()
+# the locks ensuring that each key is only loaded once
+_key_locks = {}
+# the hash of the source code of this package, computed on first use
+_code_hash = None
+# the on-disk cache directories which have been pruned by this process
+_pruned_cache_dirs = set()
+
 
 def get_index(url):
-    logger.debug("Load index from '%s'" % url)
-    yaml_str = load_url(url)
-    data = yaml.load(yaml_str)
+    def load():
+        logger.debug("Load index from '%s'" % url)
+        return load_url(url)
+    yaml_str = _get_cached(('index', url), load)
     base_url = os.path.dirname(url)
-    return Index(data, base_url)
+    return get_snapshot(
+        ('Index', base_url), yaml_str,
+        lambda: Index(load_yaml(yaml_str), base_url))
+
+
+def get_rosdistro_index(url):
+    from rosdistro import get_index as get_rosdistro_index_
+    return _get_cached(
+        ('rosdistro_index', url), lambda: get_rosdistro_index_(url),
+        persistent=True)
+
+
+def get_distribution_file(index, rosdistro_name, build_file=None):
+    """
+    Get the distribution file merged from all tag-matching files.
 
+    The result is cached per distribution and tag filter of the build file.
+    Since the returned object is shared between all callers it must not be
+    modified.
+    It is always a copy which doesn't share any state with the cached
+    distribution files though.
+    """
+    dist_key = _get_distribution_key(index, rosdistro_name)
+    if build_file is None:
+        key = ('distribution_file', ) + dist_key
+    else:
+        key = ('distribution_file', ) + dist_key + (
+            tuple(build_file.tag_whitelist), tuple(build_file.tag_blacklist))
 
-def get_distribution_file(index, rosdistro_name, build_file):
+    def load():
+        dist_files = _get_distribution_files(index, rosdistro_name)
+        if build_file is not None:
+            dist_files = build_file.filter_distribution_files_by_tags(
+                dist_files)
+        if not dist_files:
+            return []
+        # the distribution files are shared through the cache and merging
+        # modifies the first file
+        dist_file = copy.deepcopy(dist_files[0])
+        for other_dist_file in dist_files[1:]:
+            dist_file.merge(other_dist_file)
+        return dist_file
+    return _get_cached(key, load)
+
+
+def _get_distribution_files(index, rosdistro_name):
     from rosdistro import get_distribution_files
-    dist_files = get_distribution_files(index, rosdistro_name)
-    dist_files = build_file.filter_distribution_files_by_tags(dist_files)
-    while len(dist_files) > 1:
-        dist_files[0].merge(dist_files[1])
-        del dist_files[1]
-    return dist_files[0] if dist_files else []
+    return _get_cached(
+        ('distribution_files', ) +
+        _get_distribution_key(index, rosdistro_name),
+        lambda: get_distribution_files(index, rosdistro_name),
+        persistent=True)
+
+
+def get_distribution_cache(index, rosdistro_name):
+    from rosdistro import get_distribution_cache as get_distribution_cache_
+    return _get_cached(
+        ('distribution_cache', ) +
+        _get_distribution_key(index, rosdistro_name),
+        lambda: get_distribution_cache_(index, rosdistro_name),
+        persistent=True)
+
+
+def clear_cache():
+    """Clear the process-wide cache of loaded data."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def get_snapshot(key, content, create):
+    """
+    Get the object created from a string, e.g. the content of a file.
+
+    The object is cached by the hash of the content and, if an on-disk
+    cache is configured, pickled so that other processes can skip parsing
+    and validating the same content.
+    The key also contains the hash of the source code of this package so
+    that pickled objects are not reused after the classes have changed.
+
+    :param key: a tuple identifying the kind of object
+    :param content: the string the object is created from
+    :param create: a function without arguments creating the object
+    """
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    content_hash = hashlib.sha256(content).hexdigest()
+    return _get_cached(
+        ('snapshot', _get_code_hash()) + key + (content_hash, ), create,
+        persistent=True, expires=False)
+
+
+def _get_code_hash():
+    global _code_hash
+    if _code_hash is None:
+        basepath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code_hash = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(basepath):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith('.py'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                code_hash.update(os.path.relpath(path, basepath).encode())
+                with open(path, 'rb') as h:
+                    code_hash.update(h.read())
+        _code_hash = code_hash.hexdigest()
+    return _code_hash
+
+
+def _get_distribution_key(index, rosdistro_name):
+    # the urls of the distribution identify the data independent of the
+    # index instance
+    return (
+        rosdistro_name,
+        json.dumps(index.distributions.get(rosdistro_name), sort_keys=True))
+
+
+def _get_cached(key, load, persistent=False, expires=True):
+    """
+    Get a value from the process-wide cache or load it.
+
+    If `persistent` is set and the environment variable
+    `ROS_BUILDFARM_CONFIG_CACHE_DIR` is set the value is also looked up in
+    and stored to an on-disk cache in that directory.
+    Unless `expires` is `False` the on-disk entries are only used for
+    `ROS_BUILDFARM_CONFIG_CACHE_MAX_AGE` seconds.
+    Entries which haven't been used for
+    `ROS_BUILDFARM_CONFIG_CACHE_RETENTION` seconds are removed from the
+    on-disk cache.
+    """
+    with _cache_lock:
+        try:
+            return _cache[key]
+        except KeyError:
+            pass
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    # the key specific lock allows loading different keys concurrently
+    with key_lock:
+        try:
+            return _cache[key]
+        except KeyError:
+            pass
+
+        cache_dir = os.environ.get(CACHE_DIR_ENVIRONMENT_VARIABLE) \
+            if persistent else None
+        value = None
+        if cache_dir:
+            value = _load_from_disk_cache(cache_dir, key, expires)
+        if value is None:
+            value = load()
+            if cache_dir:
+                _store_in_disk_cache(cache_dir, key, value)
+        with _cache_lock:
+            _cache[key] = value
+        return value
+
+
+def _get_disk_cache_filename(cache_dir, key):
+    return os.path.join(
+        cache_dir, hashlib.md5(repr(key).encode()).hexdigest() + '.pickle')
+
+
+def _load_from_disk_cache(cache_dir, key, expires=True):
+    filename = _get_disk_cache_filename(cache_dir, key)
+    max_age = int(os.environ.get(
+        CACHE_MAX_AGE_ENVIRONMENT_VARIABLE, DEFAULT_CACHE_MAX_AGE))
+    try:
+        if expires and time.time() - os.path.getmtime(filename) > max_age:
+            return None
+        with open(filename, 'rb') as h:
+            cached_key, value = pickle.load(h)
+    except Exception:
+        return None
+    if cached_key != key:
+        return None
+    logger.debug("Using cached data from '%s'" % filename)
+    if not expires:
+        # mark the entry as recently used to prevent it from being pruned
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+    return value
+
+
+def _store_in_disk_cache(cache_dir, key, value):
+    filename = _get_disk_cache_filename(cache_dir, key)
+    tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+    try:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        with open(tmp_filename, 'wb') as h:
+            pickle.dump((key, value), h, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_filename, filename)
+    except (OSError, pickle.PicklingError) as e:
+        logger.debug("Failed to write cache file '%s': %s" % (filename, e))
+    _prune_disk_cache(cache_dir)
+
+
+def _prune_disk_cache(cache_dir):
+    # remove entries which haven't been used recently, once per process
+    with _cache_lock:
+        if cache_dir in _pruned_cache_dirs:
+            return
+        _pruned_cache_dirs.add(cache_dir)
+    retention = int(os.environ.get(
+        CACHE_RETENTION_ENVIRONMENT_VARIABLE, DEFAULT_CACHE_RETENTION))
+    now = time.time()
+    try:
+        filenames = os.listdir(cache_dir)
+    except OSError:
+        return
+    for filename in filenames:
+        if not filename.endswith('.pickle'):
+            continue
+        path = os.path.join(cache_dir, filename)
+        try:
+            if now - os.path.getmtime(path) > retention:
+                os.remove(path)
+        except OSError:
+            # another process might have removed the file concurrently
+            pass
 
 
 def get_release_build_files(index, dist_name):
-    data = _get_build_file_data(index, dist_name, 'release_builds')
-    build_files = {}
-    for k, v in data.items():
-        build_files[k] = ReleaseBuildFile(dist_name, v)
-    return build_files
+    return _get_build_files(
+        index, dist_name, 'release_builds', ReleaseBuildFile)
 
 
 def get_source_build_files(index, dist_name):
-    data = _get_build_file_data(index, dist_name, 'source_builds')
-    build_files = {}
-    for k, v in data.items():
-        build_files[k] = SourceBuildFile(dist_name, v)
-    return build_files
+    return _get_build_files(
+        index, dist_name, 'source_builds', SourceBuildFile)
 
 
 def get_doc_build_files(index, dist_name):
-    data = _get_build_file_data(index, dist_name, 'doc_builds')
-    build_files = {}
-    for k, v in data.items():
-        build_files[k] = DocBuildFile(dist_name, v)
-    return build_files
+    return _get_build_files(index, dist_name, 'doc_builds', DocBuildFile)
 
 
-def _get_build_file_data(index, dist_name, type_):
+def _get_build_files(index, dist_name, type_, build_file_class):
     if dist_name not in index.distributions.keys():
         raise RuntimeError(
             "Unknown release: '{0}'. Valid release names are: {1}".format(
@@ -99,12 +329,27 @@ def _get_build_file_data(index, dist_name, type_):
         return {}
     url = dist[type_]
 
-    def _load_yaml_data(url):
-        logger.debug('Load file from "%s"' % url)
-        yaml_str = load_url(url)
-        return yaml.load(yaml_str)
+    def _load_build_file(url):
+        def load():
+            logger.debug('Load file from "%s"' % url)
+            return load_url(url)
+        yaml_str = _get_cached(('build_file', url), load)
+        return get_snapshot(
+            (build_file_class.__name__, dist_name), yaml_str,
+            lambda: build_file_class(dist_name, load_yaml(yaml_str)))
 
-    data = {}
-    for k, v in url.items():
-        data[k] = _load_yaml_data(v)
-    return data
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+    except ImportError:
+        # Python 2 without the futures backport
+        return dict([(k, _load_build_file(v)) for k, v in url.items()])
+    with ThreadPoolExecutor(
+            max_workers=max(1, min(MAX_CONCURRENT_FETCHES, len(url)))) \
+            as executor:
+        futures = dict(
+            [(k, executor.submit(_load_build_file, v))
+             for k, v in url.items()])
+    build_files = {}
+    for k, future in futures.items():
+        build_files[k] = future.result()
+    return build_files
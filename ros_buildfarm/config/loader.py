@@ -31,27 +31,76 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import hashlib
+import json
+import logging
+import os
 import socket
+import threading
 import time
+import yaml
 try:
+    from urllib.request import Request
     from urllib.request import urlopen
     from urllib.error import HTTPError
     from urllib.error import URLError
+    from urllib.parse import urlsplit
 except ImportError:
+    from urllib2 import Request
     from urllib2 import urlopen
     from urllib2 import HTTPError
     from urllib2 import URLError
+    from urlparse import urlsplit
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    # fall back to a new connection for every request
+    requests = None
+
+logger = logging.getLogger('ros_buildfarm.config')
+
+# the directory of the optional on-disk cache shared between processes
+CACHE_DIR_ENVIRONMENT_VARIABLE = 'ROS_BUILDFARM_CONFIG_CACHE_DIR'
+
+# the maximum number of connections kept alive per host
+MAX_CONNECTIONS_PER_HOST = 8
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def load_yaml(stream):
+    """
+    Parse YAML data using the libyaml based loader if available.
+
+    Only plain data is supported, no arbitrary Python objects.
+    """
+    return yaml.load(stream, Loader=_yaml_loader)
+
+
+try:
+    _yaml_loader = yaml.CSafeLoader
+except AttributeError:
+    _yaml_loader = yaml.SafeLoader
 
 
 def load_url(url, retry=2, retry_period=1, timeout=10, skip_decode=False):
+    """
+    Load the content of an url.
+
+    If the environment variable `ROS_BUILDFARM_CONFIG_CACHE_DIR` is set the
+    content is cached in that directory and revalidated using the `ETag` /
+    `Last-Modified` header of the previous response.
+    """
     try:
-        fh = urlopen(url, timeout=timeout)
+        contents = _load_url(url, timeout)
     except HTTPError as e:
         if e.code == 503 and retry:
             time.sleep(retry_period)
             return load_url(
                 url, retry=retry - 1, retry_period=retry_period,
-                timeout=timeout)
+                timeout=timeout, skip_decode=skip_decode)
         e.msg += ' (%s)' % url
         raise
     except URLError as e:
@@ -59,11 +108,116 @@ def load_url(url, retry=2, retry_period=1, timeout=10, skip_decode=False):
             time.sleep(retry_period)
             return load_url(
                 url, retry=retry - 1, retry_period=retry_period,
-                timeout=timeout)
+                timeout=timeout, skip_decode=skip_decode)
         raise URLError(str(e) + ' (%s)' % url)
     # Python 2/3 Compatibility
-    contents = fh.read()
     if isinstance(contents, str) or skip_decode:
         return contents
     else:
         return contents.decode('utf-8')
+
+
+def _load_url(url, timeout):
+    cache_dir = os.environ.get(CACHE_DIR_ENVIRONMENT_VARIABLE)
+    if not cache_dir:
+        return _open_url(url, {}, timeout)[1]
+
+    cache_filename = os.path.join(
+        cache_dir, 'urls', hashlib.md5(url.encode()).hexdigest())
+    metadata = None
+    if os.path.exists(cache_filename) and \
+            os.path.exists(cache_filename + '.json'):
+        try:
+            with open(cache_filename + '.json', 'r') as h:
+                metadata = json.load(h)
+        except ValueError:
+            pass
+
+    headers = {}
+    if metadata:
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+
+    status, contents, response_headers = _open_url(url, headers, timeout)
+    if status == 304:
+        logger.debug("Using cached content of '%s'" % url)
+        with open(cache_filename, 'rb') as h:
+            return h.read()
+
+    metadata = {
+        'url': url,
+        'etag': response_headers.get('ETag'),
+        'last_modified': response_headers.get('Last-Modified'),
+    }
+    if metadata['etag'] or metadata['last_modified']:
+        _write_cache_file(cache_filename, contents, metadata)
+    return contents
+
+
+def _write_cache_file(cache_filename, contents, metadata):
+    tmp_suffix = '.%d.%d.tmp' % (os.getpid(), threading.current_thread().ident)
+    try:
+        cache_dirname = os.path.dirname(cache_filename)
+        if not os.path.exists(cache_dirname):
+            os.makedirs(cache_dirname)
+        with open(cache_filename + tmp_suffix, 'wb') as h:
+            h.write(contents)
+        with open(cache_filename + '.json' + tmp_suffix, 'w') as h:
+            json.dump(metadata, h, sort_keys=True)
+        # the metadata must not refer to a previous content
+        if os.path.exists(cache_filename + '.json'):
+            os.remove(cache_filename + '.json')
+        os.rename(cache_filename + tmp_suffix, cache_filename)
+        os.rename(cache_filename + '.json' + tmp_suffix,
+                  cache_filename + '.json')
+    except OSError as e:
+        logger.debug(
+            "Failed to write cache file '%s': %s" % (cache_filename, e))
+
+
+def _open_url(url, headers, timeout):
+    """
+    Request an url.
+
+    If `requests` is available HTTP(S) requests are sent over kept alive
+    connections shared by all threads.
+
+    :return: a tuple of the status code, the content and the headers
+    :raises HTTPError: for error status codes
+    :raises URLError: if the connection failed
+    """
+    if requests is None or urlsplit(url).scheme not in ('http', 'https'):
+        request = Request(url, headers=headers)
+        try:
+            fh = urlopen(request, timeout=timeout)
+        except HTTPError as e:
+            if e.code != 304:
+                raise
+            return e.code, None, e.headers
+        return getattr(fh, 'status', 200), fh.read(), fh.info()
+
+    try:
+        response = _get_session().get(url, headers=headers, timeout=timeout)
+    except requests.Timeout as e:
+        raise URLError(socket.timeout(str(e)))
+    except requests.RequestException as e:
+        raise URLError(e)
+    if response.status_code >= 400:
+        raise HTTPError(
+            response.url, response.status_code, response.reason,
+            response.headers, None)
+    return response.status_code, response.content, response.headers
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(pool_maxsize=MAX_CONNECTIONS_PER_HOST)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
@@ -69,6 +69,15 @@ class ReleaseBuildFile(BuildFile):
         if 'jenkins_binary_job_priority' in data:
             self.jenkins_binary_job_priority = \
                 int(data['jenkins_binary_job_priority'])
+        self.jenkins_binary_job_priority_range = None
+        if 'jenkins_binary_job_priority_range' in data:
+            self.jenkins_binary_job_priority_range = \
+                int(data['jenkins_binary_job_priority_range'])
+            assert self.jenkins_binary_job_priority is not None, \
+                "'jenkins_binary_job_priority_range' requires " + \
+                "'jenkins_binary_job_priority' to be set"
+            assert self.jenkins_binary_job_priority_range >= 0, \
+                "'jenkins_binary_job_priority_range' must not be negative"
         self.jenkins_binary_job_timeout = None
         if 'jenkins_binary_job_timeout' in data:
             self.jenkins_binary_job_timeout = \
@@ -1,25 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
 from gzip import GzipFile
 import hashlib
 from io import BytesIO
+import json
 import logging
 import os
+import re
+import shutil
 import socket
+import threading
 import time
 from urllib.error import HTTPError
 from urllib.error import URLError
+from urllib.parse import urlparse
+from urllib.request import Request
 from urllib.request import urlopen
 
 
-def get_debian_repo_data(debian_repository_baseurl, targets, cache_dir):
-    data = {}
-    for target in targets:
-        index = get_debian_repo_index(
-            debian_repository_baseurl, target, cache_dir)
-        data[target] = index
-    return data
+# the maximum number of indexes being fetched concurrently
+MAX_CONCURRENT_FETCHES = 8
+# the maximum number of concurrent connections to the same host
+MAX_CONNECTIONS_PER_HOST = 4
+
+
+def get_debian_repo_data(
+        debian_repository_baseurl, targets, cache_dir, max_age=None):
+    return get_debian_repos_data(
+        [debian_repository_baseurl], targets, cache_dir, max_age=max_age)[0]
+
+
+def get_debian_repos_data(
+        debian_repository_baseurls, targets, cache_dir, max_age=None,
+        max_workers=MAX_CONCURRENT_FETCHES):
+    """
+    Get the package versions for all targets of multiple repositories.
+
+    The indexes are fetched concurrently by a pool of `max_workers` threads
+    while the number of concurrent connections to the same host is limited
+    to `MAX_CONNECTIONS_PER_HOST`.
+
+    :return: a list with one dict per repository which maps each target to
+      the package versions returned by `get_debian_repo_index`
+    """
+    host_semaphores = {}
+    for baseurl in debian_repository_baseurls:
+        host = urlparse(baseurl).netloc
+        if host not in host_semaphores:
+            host_semaphores[host] = \
+                threading.BoundedSemaphore(MAX_CONNECTIONS_PER_HOST)
 
+    def get_index(baseurl, target):
+        host_semaphore = host_semaphores[urlparse(baseurl).netloc]
+        return get_debian_repo_index(
+            baseurl, target, cache_dir, max_age=max_age,
+            fetch_semaphore=host_semaphore)
 
-def get_debian_repo_index(debian_repository_baseurl, target, cache_dir):
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            [
+                executor.submit(get_index, baseurl, target)
+                for target in targets]
+            for baseurl in debian_repository_baseurls]
+        # results are collected in order to raise the same error as a
+        # sequential fetch would
+        return [
+            dict(zip(targets, [f.result() for f in repo_futures]))
+            for repo_futures in futures]
+
+
+def get_debian_repo_index(
+        debian_repository_baseurl, target, cache_dir, max_age=None,
+        fetch_semaphore=None):
+    """
+    Get the version of every package in a Debian repository index.
+
+    The decompressed index is cached in the cache directory together with
+    the HTTP validators (`ETag` / `Last-Modified`) of the response.
+    Once the cache is older than `max_age` it is revalidated with a
+    conditional request.
+    If the server doesn't provide any validators the checksum of the index
+    listed in the `Release` file is used to detect changes instead.
+
+    :param max_age: the number of seconds a cached index is considered
+      fresh without revalidation, if `None` the `max-age` of the
+      `Cache-Control` header of the server is used
+    :param fetch_semaphore: an optional semaphore which is held while the
+      index is being revalidated or downloaded
+    """
     url = os.path.join(
         debian_repository_baseurl, 'dists', target.os_code_name, 'main')
     if target.arch == 'source':
@@ -29,59 +96,352 @@ def get_debian_repo_index(debian_repository_baseurl, target, cache_dir):
 
     cache_filename = os.path.join(
         cache_dir, hashlib.md5(url.encode()).hexdigest())
-    if not os.path.exists(cache_filename):
-        fetch_gzip_url(url, cache_filename)
+    if fetch_semaphore is None:
+        update_cached_index(url, cache_filename, max_age=max_age)
+    else:
+        with fetch_semaphore:
+            update_cached_index(url, cache_filename, max_age=max_age)
 
     logging.debug('Reading file: %s' % cache_filename)
-    # split package blocks
-    with open(cache_filename, 'rb') as f:
-        blocks = f.read().decode('utf8').split('\n\n')
-    blocks = [b.splitlines() for b in blocks if b]
+    with open(cache_filename, 'r', encoding='utf8') as f:
+        return get_package_versions(f)
 
-    # extract version number of every package
-    package_versions = {}
-    for lines in blocks:
-        prefix = 'Package: '
-        assert lines[0].startswith(prefix)
-        debian_pkg_name = lines[0][len(prefix):]
 
-        prefix = 'Version: '
-        versions = [l[len(prefix):] for l in lines if l.startswith(prefix)]
-        version = versions[0] if len(versions) == 1 else None
+def update_cached_index(url, cache_filename, max_age=None):
+    """
+    Ensure that the cache file contains the current index of the url.
+
+    The metadata of the cached index is stored in a JSON file next to it.
+    """
+    metadata_filename = cache_filename + '.json'
+    metadata = None
+    if os.path.exists(cache_filename) and \
+            os.path.exists(metadata_filename):
+        with open(metadata_filename, 'r') as h:
+            try:
+                metadata = json.load(h)
+            except ValueError:
+                pass
+
+    if metadata is not None:
+        if max_age is None:
+            max_age = metadata.get('max_age') or 0
+        if time.time() - metadata.get('timestamp', 0) < max_age:
+            logging.debug('Using fresh cached index: %s' % url)
+            return
+
+        # only skip pdiffs if the repository doesn't provide any
+        diff_index = None
+        if metadata.get('pdiff', True):
+            diff_index = get_diff_index(url)
+            metadata['pdiff'] = diff_index is not None
+        if diff_index is not None:
+            patch_count = update_cached_index_from_diffs(
+                url, cache_filename, diff_index)
+            if patch_count is not None:
+                metadata['timestamp'] = time.time()
+                if patch_count:
+                    # the validators refer to the previous index
+                    metadata['etag'] = None
+                    metadata['last_modified'] = None
+                    metadata['sha256'] = None
+                _write_metadata(metadata_filename, metadata)
+                return
+
+    headers = {}
+    checksum = None
+    if metadata is not None:
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+        if not headers:
+            checksum = get_release_checksum(url)
+            if checksum is not None and checksum == metadata.get('sha256'):
+                logging.debug(
+                    "Cached index matches the checksum from the 'Release' "
+                    'file: %s' % url)
+                metadata['timestamp'] = time.time()
+                _write_metadata(metadata_filename, metadata)
+                return
+
+    try:
+        info = fetch_gzip_url(url, cache_filename, headers=headers)
+    except HTTPError as e:
+        if e.code != 304:
+            raise
+        logging.debug('Cached index is still valid: %s' % url)
+        metadata['timestamp'] = time.time()
+        metadata['max_age'] = _get_max_age(e.headers) or \
+            metadata.get('max_age')
+        _write_metadata(metadata_filename, metadata)
+        return
+
+    metadata = {
+        'url': url,
+        'timestamp': time.time(),
+        'etag': info.get('ETag'),
+        'last_modified': info.get('Last-Modified'),
+        'max_age': _get_max_age(info),
+        'pdiff': (metadata or {}).get('pdiff', True),
+    }
+    if not metadata['etag'] and not metadata['last_modified']:
+        if checksum is None:
+            checksum = get_release_checksum(url)
+        metadata['sha256'] = checksum
+    _write_metadata(metadata_filename, metadata)
+
+
+def get_diff_index(url):
+    """
+    Get the parsed `<index>.diff/Index` file of an index.
+
+    :return: a dict with the entries or `None` if the repository doesn't
+      provide pdiffs for the index
+    """
+    if not url.endswith('.gz'):
+        return None
+    diff_url = url[:-3] + '.diff/'
+    try:
+        content = load_url(diff_url + 'Index').decode('utf8')
+    except (HTTPError, URLError) as e:
+        logging.debug("Failed to fetch pdiff index '%s': %s" % (diff_url, e))
+        return None
+    return _parse_diff_index(content)
+
+
+def update_cached_index_from_diffs(url, cache_filename, diff_index):
+    """
+    Patch the cached index forward using the pdiffs of the repository.
+
+    The `<index>.diff/Index` file lists the checksums of previous versions
+    of the index together with the ed-style patches to bring each of them
+    up-to-date.
+
+    :return: the number of applied patches or `None` if the cached index
+      couldn't be updated this way and needs to be downloaded
+    """
+    diff_url = url[:-3] + '.diff/'
+    for algorithm in ('SHA256', 'SHA1'):
+        if algorithm + '-Current' in diff_index:
+            break
+    else:
+        return None
+    current_checksum = diff_index[algorithm + '-Current'][0][0]
+    history = diff_index.get(algorithm + '-History', [])
+    local_checksum = _get_file_checksum(cache_filename, algorithm)
 
-        package_versions[debian_pkg_name] = version
+    if local_checksum == current_checksum:
+        logging.debug('Cached index is current according to pdiffs: %s' % url)
+        return 0
+    checksums = [entry[0] for entry in history]
+    if local_checksum not in checksums:
+        logging.debug(
+            'Cached index is not part of the pdiff history: %s' % url)
+        return None
+    patch_names = [entry[2] for entry in history]
+    patch_names = patch_names[checksums.index(local_checksum):]
 
+    logging.debug('Applying %d pdiffs: %s' % (len(patch_names), url))
+    with open(cache_filename, 'r', encoding='utf8') as h:
+        lines = h.readlines()
+    try:
+        for patch_name in patch_names:
+            patch = GzipFile(
+                fileobj=BytesIO(load_url(diff_url + patch_name + '.gz')),
+                mode='rb').read().decode('utf8')
+            apply_ed_patch(lines, patch.splitlines(True))
+    except (HTTPError, URLError, OSError, ValueError) as e:
+        logging.debug("Failed to apply pdiffs of '%s': %s" % (url, e))
+        return None
+
+    content = ''.join(lines).encode('utf8')
+    if hashlib.new(algorithm.lower(), content).hexdigest() != \
+            current_checksum:
+        logging.debug('Checksum mismatch after applying pdiffs: %s' % url)
+        return None
+    tmp_filename = cache_filename + '.tmp'
+    with open(tmp_filename, 'wb') as h:
+        h.write(content)
+    os.rename(tmp_filename, cache_filename)
+    return len(patch_names)
+
+
+def apply_ed_patch(lines, patch_lines):
+    """
+    Apply a patch in the format of `diff --ed` to a list of lines in place.
+
+    The commands of such a patch are ordered from the end of the file to
+    the beginning, so the line numbers are not affected by earlier commands.
+    """
+    i = 0
+    while i < len(patch_lines):
+        command = patch_lines[i].rstrip('\n')
+        i += 1
+        match = re.match(r'^(\d+)(?:,(\d+))?([acd])$', command)
+        if not match:
+            raise ValueError("Unsupported ed command '%s'" % command)
+        start = int(match.group(1))
+        end = int(match.group(2) or start)
+        operation = match.group(3)
+
+        text = []
+        if operation in ('a', 'c'):
+            while patch_lines[i].rstrip('\n') != '.':
+                text.append(patch_lines[i])
+                i += 1
+            i += 1
+
+        if operation == 'a':
+            lines[start:start] = text
+        elif operation == 'c':
+            lines[start - 1:end] = text
+        else:
+            del lines[start - 1:end]
+
+
+def _parse_diff_index(content):
+    data = {}
+    key = None
+    for line in content.splitlines():
+        if not line.startswith(' '):
+            key, _, value = line.partition(':')
+            data[key] = []
+            if value.strip():
+                data[key].append(value.split())
+        elif key is not None:
+            data[key].append(line.split())
+    return data
+
+
+def _get_file_checksum(filename, algorithm):
+    checksum = hashlib.new(algorithm.lower())
+    with open(filename, 'rb') as h:
+        for chunk in iter(lambda: h.read(1024 * 1024), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def get_release_checksum(url):
+    """
+    Get the SHA256 checksum of an index from the `Release` file.
+
+    :param url: the url of an index below a `dists/<code_name>` folder
+    :return: the checksum or `None` if it couldn't be determined
+    """
+    parts = url.split('/')
+    try:
+        index = len(parts) - 1 - parts[::-1].index('dists')
+    except ValueError:
+        return None
+    release_url = '/'.join(parts[:index + 2] + ['Release'])
+    relative_path = '/'.join(parts[index + 2:])
+    try:
+        content = load_url(release_url).decode('utf8')
+    except (HTTPError, URLError) as e:
+        logging.debug(
+            "Failed to fetch 'Release' file '%s': %s" % (release_url, e))
+        return None
+
+    in_sha256_section = False
+    for line in content.splitlines():
+        if not line.startswith(' '):
+            in_sha256_section = line.startswith('SHA256:')
+            continue
+        if in_sha256_section:
+            fields = line.split()
+            if len(fields) == 3 and fields[2] == relative_path:
+                return fields[0]
+    return None
+
+
+def _get_max_age(headers):
+    cache_control = headers.get('Cache-Control') or ''
+    for directive in cache_control.split(','):
+        key, _, value = directive.strip().partition('=')
+        if key.lower() == 'max-age':
+            try:
+                return int(value)
+            except ValueError:
+                pass
+    return None
+
+
+def _write_metadata(metadata_filename, metadata):
+    with open(metadata_filename, 'w') as h:
+        json.dump(metadata, h, sort_keys=True)
+
+
+def get_package_versions(lines):
+    """
+    Extract the version number of every package from an index.
+
+    The lines of a `Packages` or `Sources` file are processed one at a time
+    so that the index never needs to be held in memory as a whole.
+
+    :param lines: an iterable of lines, e.g. an opened file
+    :return: a dict indexed by the package name containing the version or
+      `None` if the package block does not contain exactly one version
+    """
+    package_versions = {}
+    debian_pkg_name = None
+    versions = []
+    for line in lines:
+        if line.startswith('Package: '):
+            debian_pkg_name = line[9:].rstrip('\n')
+        elif line.startswith('Version: '):
+            versions.append(line[9:].rstrip('\n'))
+        elif not line.strip():
+            if debian_pkg_name is not None:
+                package_versions[debian_pkg_name] = \
+                    versions[0] if len(versions) == 1 else None
+            debian_pkg_name = None
+            versions = []
+    if debian_pkg_name is not None:
+        package_versions[debian_pkg_name] = \
+            versions[0] if len(versions) == 1 else None
     return package_versions
 
 
-def fetch_gzip_url(url, dst_filename):
+def fetch_gzip_url(url, dst_filename, headers=None):
     dst_dirname = os.path.dirname(dst_filename)
-    if not os.path.exists(dst_dirname):
-        os.makedirs(dst_dirname)
+    # the directory might be created concurrently by another thread
+    os.makedirs(dst_dirname, exist_ok=True)
     logging.debug('Downloading gz url: %s' % url)
-    gz_str = load_url(url)
-    gz_stream = BytesIO(gz_str)
+    fh = open_url(url, headers=headers)
+    gz_stream = BytesIO(fh.read())
     g = GzipFile(fileobj=gz_stream, mode='rb')
-    with open(dst_filename, 'wb') as f:
-        f.write(g.read())
+    # decompress in chunks to not hold the whole index in memory
+    # and replace the destination atomically
+    tmp_filename = dst_filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        shutil.copyfileobj(g, f)
+    os.rename(tmp_filename, dst_filename)
+    return fh.info()
 
 
 def load_url(url, retry=2, retry_period=1, timeout=10):
+    return open_url(
+        url, retry=retry, retry_period=retry_period, timeout=timeout).read()
+
+
+def open_url(url, headers=None, retry=2, retry_period=1, timeout=10):
+    request = Request(url, headers=headers or {})
     try:
-        fh = urlopen(url, timeout=timeout)
+        fh = urlopen(request, timeout=timeout)
     except HTTPError as e:
         if e.code == 503 and retry:
             time.sleep(retry_period)
-            return load_url(
-                url, retry=retry - 1, retry_period=retry_period,
-                timeout=timeout)
+            return open_url(
+                url, headers=headers, retry=retry - 1,
+                retry_period=retry_period, timeout=timeout)
         e.msg += ' (%s)' % url
         raise
     except URLError as e:
         if isinstance(e.reason, socket.timeout) and retry:
             time.sleep(retry_period)
-            return load_url(
-                url, retry=retry - 1, retry_period=retry_period,
-                timeout=timeout)
+            return open_url(
+                url, headers=headers, retry=retry - 1,
+                retry_period=retry_period, timeout=timeout)
         raise URLError(str(e) + ' (%s)' % url)
-    return fh.read()
+    return fh
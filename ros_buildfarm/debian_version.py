@@ -0,0 +1,70 @@
+from functools import lru_cache
+import re
+
+_digits_regex = re.compile(r'(\d+)')
+
+# the empty part which the end of a version string is equivalent to
+_EMPTY_PART = ((0, ), 0)
+
+
+@lru_cache(maxsize=65536)
+def get_debian_version_key(version):
+    """
+    Get a key for a Debian version following the ordering rules of dpkg.
+
+    The key consists of the epoch, the upstream version and the Debian
+    revision.
+    Comparing the keys of two versions is equivalent to comparing the
+    versions with `dpkg --compare-versions`, therefore the key can also be
+    used for sorting.
+
+    >>> get_debian_version_key('1.0~rc1') < get_debian_version_key('1.0')
+    True
+    >>> get_debian_version_key('1:0.1') > get_debian_version_key('2.0')
+    True
+    """
+    epoch = 0
+    if ':' in version:
+        epoch_str, version = version.split(':', 1)
+        epoch = int(epoch_str) if epoch_str else 0
+    revision = ''
+    if '-' in version:
+        version, revision = version.rsplit('-', 1)
+    return (epoch, _get_part_key(version), _get_part_key(revision))
+
+
+def compare_debian_versions(version, other_version):
+    """
+    Compare two Debian versions.
+
+    :return: a negative value if the first version is lower, zero if both
+      are equal and a positive value if the first version is higher
+    """
+    key = get_debian_version_key(version)
+    other_key = get_debian_version_key(other_version)
+    return (key > other_key) - (key < other_key)
+
+
+def _get_part_key(part):
+    # the string is split into alternating non-digit and digit sequences
+    # e.g. '1.2~rc' -> ['', '1', '.', '2', '~rc']
+    tokens = _digits_regex.split(part)
+    if len(tokens) % 2:
+        tokens.append('')
+    key = [
+        (_get_lexical_key(tokens[i]), int(tokens[i + 1] or 0))
+        for i in range(0, len(tokens), 2)]
+    # trailing empty parts are equivalent to the end of the string
+    while key and key[-1] == _EMPTY_PART:
+        key.pop()
+    # the end is lower than anything except a tilde
+    key.append(_EMPTY_PART)
+    return tuple(key)
+
+
+def _get_lexical_key(string):
+    # a tilde sorts before anything, even the end of the string,
+    # followed by letters and then all other characters
+    return tuple(
+        -1 if c == '~' else ord(c) if c.isalpha() else ord(c) + 256
+        for c in string) + (0, )
@@ -0,0 +1,273 @@
+from collections import deque
+
+from ros_buildfarm.package_manifest import get_release_package_manifest
+
+
+class DependencyGraph(object):
+
+    """
+    The dependencies between a set of packages.
+
+    The package names are interned into integer ids and the forward as well
+    as the reverse adjacency lists are built once.
+    Therefore determining the recursive dependencies or dependents of any
+    set of packages is linear in the number of packages and dependencies.
+    """
+
+    def __init__(self, dependencies):
+        """
+        :param dependencies: a dict mapping each package name to the names
+          of its direct dependencies, names which are not a key of the dict
+          are ignored
+        """
+        self._names = sorted(dependencies.keys())
+        self._ids = {name: i for i, name in enumerate(self._names)}
+        self._forward = [[] for _ in self._names]
+        self._reverse = [[] for _ in self._names]
+        self._reduced_dependencies = None
+        for name, dep_names in dependencies.items():
+            id_ = self._ids[name]
+            for dep_name in set(dep_names or []):
+                dep_id = self._ids.get(dep_name)
+                if dep_id is None or dep_id == id_:
+                    continue
+                self._forward[id_].append(dep_id)
+                self._reverse[dep_id].append(id_)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __len__(self):
+        return len(self._names)
+
+    @property
+    def names(self):
+        return list(self._names)
+
+    def get_subgraph(self, names):
+        """
+        Get the dependency graph between a subset of the packages.
+
+        Dependencies on packages which are not part of the subset are
+        dropped, unknown names are ignored.
+        """
+        return DependencyGraph(dict(
+            (name, self.get_dependencies(name))
+            for name in names if name in self._ids))
+
+    def get_dependencies(self, name):
+        """Get the names of the direct dependencies of a package."""
+        return set(self._names[i] for i in self._forward[self._ids[name]])
+
+    def get_dependents(self, name):
+        """Get the names of the packages directly depending on a package."""
+        return set(self._names[i] for i in self._reverse[self._ids[name]])
+
+    def get_recursive_dependencies(self, names, max_depth=None):
+        """
+        Get the names of all packages the passed packages depend on.
+
+        The passed names are not part of the result, unknown names are
+        ignored.
+
+        :param max_depth: the maximum number of dependency levels to follow,
+          `None` follows all levels
+        """
+        return self._traverse(names, self._forward, max_depth)
+
+    def get_recursive_dependents(self, names, max_depth=None):
+        """
+        Get the names of all packages depending on the passed packages.
+
+        The passed names are not part of the result, unknown names are
+        ignored.
+
+        :param max_depth: the maximum number of dependency levels to follow,
+          `None` follows all levels
+        """
+        return self._traverse(names, self._reverse, max_depth)
+
+    def get_levels(self):
+        """
+        Get the package names grouped into levels in topological order.
+
+        The packages of the first level have no dependencies, every other
+        package is in the level after its latest dependency.
+        Therefore the packages of one level only depend on packages of
+        earlier levels.
+        Packages which are part of a dependency cycle or depend on one are
+        grouped into an additional last level.
+
+        :returns: a list of lists of package names
+        """
+        levels, cyclic_ids = self._get_levels()
+        if cyclic_ids:
+            levels.append(cyclic_ids)
+        return [[self._names[i] for i in level] for level in levels]
+
+    def get_downstream_chain_lengths(self):
+        """
+        Get the length of the longest chain of dependents of each package.
+
+        A package without dependents has a length of zero.
+        For packages which are part of or depend on a dependency cycle the
+        lengths are limited by the number of these packages.
+
+        :returns: a dict mapping package names to the chain lengths
+        """
+        levels, cyclic_ids = self._get_levels()
+        lengths = [0] * len(self._names)
+        # the lengths within cycles are relaxed a bounded number of times
+        for _ in range(len(cyclic_ids)):
+            changed = False
+            for id_ in cyclic_ids:
+                length = min(len(cyclic_ids) - 1, max(
+                    [lengths[i] + 1 for i in self._reverse[id_]] or [0]))
+                if length != lengths[id_]:
+                    lengths[id_] = length
+                    changed = True
+            if not changed:
+                break
+        for level in reversed(levels):
+            for id_ in level:
+                lengths[id_] = max(
+                    [lengths[i] + 1 for i in self._reverse[id_]] or [0])
+        return dict(zip(self._names, lengths))
+
+    def get_recursive_dependents_counts(self):
+        """
+        Get the number of recursive dependents of each package.
+
+        :returns: a dict mapping package names to the number of packages
+          depending directly or indirectly on them
+        """
+        levels, cyclic_ids = self._get_levels()
+        # the recursive dependents of each package as a bit set
+        dependents = [0] * len(self._names)
+        for id_ in cyclic_ids:
+            for name in self._traverse(
+                    [self._names[id_]], self._reverse, None):
+                dependents[id_] |= 1 << self._ids[name]
+        for level in reversed(levels):
+            for id_ in level:
+                for i in self._reverse[id_]:
+                    dependents[id_] |= dependents[i] | (1 << i)
+        return {
+            name: bin(dependents[i]).count('1')
+            for i, name in enumerate(self._names)}
+
+    def get_critical_path(self):
+        """
+        Get the longest chain of packages depending on each other.
+
+        The packages of this chain can only be built one after another,
+        therefore the chain determines the minimum time to build all
+        packages.
+
+        :returns: a list of package names starting with the package without
+          dependencies
+        """
+        lengths = self.get_downstream_chain_lengths()
+        if not lengths:
+            return []
+        name = max(self._names, key=lambda n: lengths[n])
+        path = [name]
+        while lengths[name]:
+            name = min(
+                (n for n in self.get_dependents(name)
+                 if lengths[n] == lengths[name] - 1),
+                default=None)
+            if name is None:
+                break
+            path.append(name)
+        return path
+
+    def get_reduced_dependencies(self, name):
+        """
+        Get the direct dependencies of a package which are not implied.
+
+        A dependency is implied if it is also a recursive dependency of
+        another direct dependency.
+        The reduced dependencies of all packages form the transitive
+        reduction of the dependency graph which has the same recursive
+        dependencies with a minimal number of edges.
+        The dependencies of packages which are part of or depend on a
+        dependency cycle are not reduced.
+        """
+        if self._reduced_dependencies is None:
+            self._reduced_dependencies = self._get_transitive_reduction()
+        return set(
+            self._names[i]
+            for i in self._reduced_dependencies[self._ids[name]])
+
+    def _get_transitive_reduction(self):
+        levels, cyclic_ids = self._get_levels()
+        # the recursive dependencies of each package as a bit set
+        recursive = [0] * len(self._names)
+        reduced = [None] * len(self._names)
+        for level in levels:
+            for id_ in level:
+                # the dependencies implied by any of the direct dependencies
+                implied = 0
+                for i in self._forward[id_]:
+                    implied |= recursive[i]
+                reduced[id_] = [
+                    i for i in self._forward[id_] if not implied >> i & 1]
+                bits = implied
+                for i in self._forward[id_]:
+                    bits |= 1 << i
+                recursive[id_] = bits
+        for id_ in cyclic_ids:
+            reduced[id_] = list(self._forward[id_])
+        return reduced
+
+    def _get_levels(self):
+        num_dependencies = [len(deps) for deps in self._forward]
+        level_ids = [i for i, n in enumerate(num_dependencies) if n == 0]
+        levels = []
+        while level_ids:
+            levels.append(sorted(level_ids))
+            next_level_ids = []
+            for id_ in level_ids:
+                for dependent_id in self._reverse[id_]:
+                    num_dependencies[dependent_id] -= 1
+                    if not num_dependencies[dependent_id]:
+                        next_level_ids.append(dependent_id)
+            level_ids = next_level_ids
+        cyclic_ids = [i for i, n in enumerate(num_dependencies) if n]
+        return levels, cyclic_ids
+
+    def _traverse(self, names, adjacency, max_depth):
+        visited = bytearray(len(self._names))
+        start_ids = [self._ids[name] for name in names if name in self._ids]
+        for id_ in start_ids:
+            visited[id_] = 1
+        queue = deque((id_, 0) for id_ in start_ids)
+        result = []
+        while queue:
+            id_, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for next_id in adjacency[id_]:
+                if visited[next_id]:
+                    continue
+                visited[next_id] = 1
+                result.append(next_id)
+                queue.append((next_id, depth + 1))
+        return set(self._names[i] for i in result)
+
+
+def get_release_dependency_graph(dist_cache, pkg_names):
+    """
+    Get the dependency graph of released packages.
+
+    The dependencies are extracted from the package manifests in the
+    distribution cache.
+    Packages which are not yet in the cache have no dependencies.
+    """
+    dependencies = {}
+    for pkg_name in pkg_names:
+        manifest = get_release_package_manifest(dist_cache, pkg_name)
+        dependencies[pkg_name] = \
+            manifest.dependencies if manifest is not None else []
+    return DependencyGraph(dependencies)
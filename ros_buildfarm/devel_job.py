@@ -2,21 +2,21 @@ from __future__ import print_function
 
 import sys
 
-from catkin_pkg.package import parse_package_string
-from rosdistro import get_distribution_cache
-from rosdistro import get_index
-
 from ros_buildfarm.common import get_devel_job_name
 from ros_buildfarm.common import get_devel_view_name
 from ros_buildfarm.common import git_github_orgunit
 from ros_buildfarm.common import get_github_project_url
 from ros_buildfarm.common \
     import get_repositories_and_script_generating_key_files
+from ros_buildfarm.common import GroovyJobConfigs
 from ros_buildfarm.common import JobValidationError
+from ros_buildfarm.config import get_distribution_cache
 from ros_buildfarm.config import get_distribution_file
 from ros_buildfarm.config import get_index as get_config_index
+from ros_buildfarm.config import get_rosdistro_index
 from ros_buildfarm.config import get_source_build_files
 from ros_buildfarm.git import get_repository
+from ros_buildfarm.package_manifest import get_maintainer_emails
 from ros_buildfarm.templates import expand_template
 
 
@@ -32,7 +32,7 @@ def configure_devel_jobs(
     build_files = get_source_build_files(config, rosdistro_name)
     build_file = build_files[source_build_name]
 
-    index = get_index(config.rosdistro_index_url)
+    index = get_rosdistro_index(config.rosdistro_index_url)
 
     dist_cache = None
     if build_file.notify_maintainers:
@@ -76,7 +76,7 @@ def configure_devel_jobs(
 
     devel_job_names = []
     pull_request_job_names = []
-    job_configs = {}
+    job_configs = GroovyJobConfigs()
     for repo_name in sorted(repo_names):
         is_disabled = repo_name not in filtered_repo_names
         if is_disabled and build_file.skip_ignored_repositories:
@@ -144,7 +144,7 @@ def configure_devel_jobs(
                         pull_request_job_names.append(job_name)
                     if groovy_script is not None:
                         print("Configuration for job '%s'" % job_name)
-                        job_configs[job_name] = job_config
+                        job_configs.add(job_name, job_config)
                 except JobValidationError as e:
                     print(e.message, file=sys.stderr)
 
@@ -200,7 +200,7 @@ def configure_devel_job(
         build_file = build_files[source_build_name]
 
     if index is None:
-        index = get_index(config.rosdistro_index_url)
+        index = get_rosdistro_index(config.rosdistro_index_url)
     if dist_file is None:
         dist_file = get_distribution_file(index, rosdistro_name, build_file)
         if not dist_file:
@@ -288,15 +288,7 @@ def _get_devel_job_config(
     maintainer_emails = set([])
     if build_file.notify_maintainers and dist_cache and repo_name:
         # add maintainers listed in latest release to recipients
-        repo = dist_cache.distribution_file.repositories[repo_name]
-        if repo.release_repository:
-            for pkg_name in repo.release_repository.package_names:
-                if pkg_name not in dist_cache.release_package_xmls:
-                    continue
-                pkg_xml = dist_cache.release_package_xmls[pkg_name]
-                pkg = parse_package_string(pkg_xml)
-                for m in pkg.maintainers:
-                    maintainer_emails.add(m.email)
+        maintainer_emails = get_maintainer_emails(dist_cache, repo_name)
 
     job_priority = \
         build_file.jenkins_commit_job_priority \
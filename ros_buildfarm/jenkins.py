@@ -1,26 +1,51 @@
 from __future__ import print_function
 
 from ast import literal_eval
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 import copy
 import difflib
+import hashlib
+import json
+import os
 import sys
+import threading
+import time
 try:
+    from urllib.parse import quote
     from urllib.request import urlopen
     from urllib.error import HTTPError
 except ImportError:
+    from urllib import quote
     from urllib2 import urlopen
     from urllib2 import HTTPError
 from xml.etree import ElementTree
 
+from jenkinsapi.custom_exceptions import JenkinsAPIException
 from jenkinsapi.jenkins import Jenkins
+from jenkinsapi.job import Job
 from jenkinsapi.utils.requester import Requester
 from jenkinsapi.views import Views
+from requests import RequestException
+from requests.adapters import HTTPAdapter
 
 from .jenkins_credentials import get_credentials
+from .jenkins_credentials import get_relative_credential_path
 from .templates import expand_template
 
 JENKINS_MANAGEMENT_VIEW = 'Manage'
 
+# the maximum number of keep-alive connections to the Jenkins master
+JENKINS_MAX_CONNECTIONS = 32
+
+# the default number of jobs being configured concurrently
+DEFAULT_CONCURRENCY = 8
+
+# the default maximum number of job invocations per second
+DEFAULT_MAX_INVOCATION_RATE = 20
+
 
 class CrumbRequester(Requester):
 
@@ -30,21 +55,36 @@ class CrumbRequester(Requester):
         super(CrumbRequester, self).__init__(*args, **kwargs)
         self._baseurl = kwargs['baseurl']
         self._last_crumb_data = None
+        # the crumb is shared between all threads using this requester
+        self._crumb_lock = threading.Lock()
+
+        session = getattr(self, 'session', None)
+        if session is not None:
+            # keep a connection alive for each concurrent request
+            adapter = HTTPAdapter(
+                pool_connections=JENKINS_MAX_CONNECTIONS,
+                pool_maxsize=JENKINS_MAX_CONNECTIONS,
+                max_retries=getattr(self, 'max_retries', None) or 0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
 
     def post_url(self, *args, **kwargs):
-        if self._last_crumb_data:
+        crumb_data = self._last_crumb_data
+        if crumb_data:
             # first try request with previous crumb if available
-            response = self._post_url_with_crumb(
-                self._last_crumb_data, *args, **kwargs)
+            response = self._post_url_with_crumb(crumb_data, *args, **kwargs)
             # code 403 might indicate that the crumb is not valid anymore
             if response.status_code != 403:
                 return response
 
         # fetch new crumb (if server has crumbs enabled)
-        if self._last_crumb_data is not False:
-            self._last_crumb_data = self._get_crumb_data()
-        return self._post_url_with_crumb(
-            self._last_crumb_data, *args, **kwargs)
+        with self._crumb_lock:
+            # another thread might have already fetched a new crumb
+            if self._last_crumb_data is not False and \
+                    self._last_crumb_data is crumb_data:
+                self._last_crumb_data = self._get_crumb_data()
+            crumb_data = self._last_crumb_data
+        return self._post_url_with_crumb(crumb_data, *args, **kwargs)
 
     def _get_crumb_data(self):
         response = self.get_url(self._baseurl + '/crumbIssuer/api/python')
@@ -86,12 +126,38 @@ class JenkinsProxy(Jenkins):
             self.__jobs = super(JenkinsProxy, self).jobs
         return self.__jobs
 
+    def clear_cache(self):
+        """Drop all cached data, e.g. after other clients changed jobs."""
+        self.__jobs = None
+        self.poll()
+
+
+# connections indexed by url which are reused by connect() if not None
+_shared_connections = None
+
+
+def share_connections():
+    """Reuse the connection to a Jenkins master for subsequent connects."""
+    global _shared_connections
+    if _shared_connections is None:
+        _shared_connections = {}
+
 
 def connect(jenkins_url):
+    if _shared_connections is not None and \
+            jenkins_url in _shared_connections:
+        print("Reusing connection to Jenkins '%s'" % jenkins_url)
+        jenkins = _shared_connections[jenkins_url]
+        # the previous user might have changed jobs and views
+        jenkins.clear_cache()
+        return jenkins
+
     print("Connecting to Jenkins '%s'" % jenkins_url)
     username, password = get_credentials(jenkins_url)
     jenkins = JenkinsProxy(jenkins_url, username=username, password=password)
     print("Connected to Jenkins version '%s'" % jenkins.version)
+    if _shared_connections is not None:
+        _shared_connections[jenkins_url] = jenkins
     return jenkins
 
 
@@ -165,24 +231,44 @@ def _get_view_type(view_config):
     assert False, 'Unknown list type: ' + root.tag
 
 
-def configure_job(jenkins, job_name, job_config, view=None):
+def configure_job(jenkins, job_name, job_config, view=None, snapshot=None):
     response_text = None
+    job = None
+    config_hash = None
+    if snapshot is not None:
+        config_hash = get_config_hash(job_config)
     try:
-        if not jenkins.has_job(job_name):
+        if snapshot is not None:
+            has_job = snapshot.has_job(job_name)
+        else:
+            has_job = jenkins.has_job(job_name)
+        if not has_job:
             print("Creating job '%s'" % job_name)
             job = jenkins.create_job(job_name, job_config)
+            if snapshot is not None:
+                snapshot.set_created(job_name)
+        elif snapshot is not None and \
+                snapshot.is_unchanged(job_name, config_hash):
+            print("Skipped '%s' because the config is the same" % job_name)
         else:
             job = jenkins.get_job(job_name)
-            remote_job_config = job.get_config()
+            response = jenkins.requester.get_and_confirm_status(
+                job.get_config_xml_url())
+            remote_job_config = response.text
             diff = _diff_configs(remote_job_config, job_config)
             if not diff:
                 print("Skipped '%s' because the config is the same" % job_name)
+                if snapshot is not None:
+                    # hash the raw bytes like the snapshot does remotely
+                    snapshot.set_unchanged(
+                        job_name, response.content, config_hash)
             else:
-                print("Updating job '%s'" % job_name)
-                print('   ', '<<<')
+                # print the diff at once to not interleave with other threads
+                lines = ["Updating job '%s'" % job_name, '    <<<']
                 for line in diff:
-                    print('   ', line.rstrip('\n'))
-                print('   ', '>>>')
+                    lines.append('    ' + line.rstrip('\n'))
+                lines.append('    >>>')
+                print('\n'.join(lines))
                 response_text = job.update_config(job_config)
                 if response_text:
                     print('Failed to update job config:\n%s' % response_text)
@@ -195,6 +281,8 @@ def configure_job(jenkins, job_name, job_config, view=None):
         raise RuntimeError(
             "Failed to configure job '%s':\n%s" % (job_name, response_text))
     if view is not None:
+        if job is None:
+            job = jenkins.get_job(job_name)
         if job_name not in view:
             print("Adding job '%s' to view '%s'" % (job_name, view.name))
             job = view.add_job(job_name, job)
@@ -203,6 +291,244 @@ def configure_job(jenkins, job_name, job_config, view=None):
     return job
 
 
+def get_job_config_hashes(jenkins):
+    """
+    Get the names and config hashes of all jobs with a single request.
+
+    :return: a dict indexed by job names containing the MD5 hash of the
+      remote config
+    """
+    script = expand_template('snippet/job_config_hashes.groovy.em', {})
+    response = jenkins.requester.post_url(
+        jenkins.baseurl + '/scriptText', data={'script': script})
+    if response.status_code != 200:
+        raise RuntimeError(
+            'Failed to fetch job config hashes (%d): %s' %
+            (response.status_code, response.text))
+    hashes = {}
+    for line in response.text.splitlines():
+        if '\t' not in line:
+            continue
+        job_name, config_hash = line.rsplit('\t', 1)
+        hashes[job_name] = config_hash
+    return hashes
+
+
+def get_job_config_snapshot_path(jenkins_url):
+    return os.path.join(
+        os.path.expanduser('~'),
+        os.path.dirname(get_relative_credential_path()),
+        'job_config_snapshots',
+        '%s.json' % hashlib.md5(jenkins_url.encode()).hexdigest())
+
+
+class JobConfigSnapshot(object):
+
+    """
+    Snapshot of the names and config hashes of all jobs on Jenkins.
+
+    Additionally it remembers for which remote config hash a generated config
+    has been verified to be the same.
+    This information is persisted between invocations so that unchanged jobs
+    can be skipped without any per-job request.
+    The persisted information is ignored when it has been written by a
+    different version of ros_buildfarm.
+    """
+
+    def __init__(self, jenkins, cache_file=None, version=None):
+        self.config_hashes = get_job_config_hashes(jenkins)
+        self._cache_file = cache_file
+        self._version = version
+        self._verified = {}
+        if cache_file is not None:
+            data = _read_json_file(cache_file)
+            if data is not None:
+                if isinstance(data, dict) and \
+                        data.get('version') == version:
+                    self._verified = data['jobs']
+                else:
+                    print(("Ignoring job config snapshot '%s' since it was " +
+                           'written by a different version of ' +
+                           'ros_buildfarm') % cache_file)
+        self._lock = threading.Lock()
+
+    def has_job(self, job_name):
+        return job_name in self.config_hashes
+
+    def get_job_names(self, job_prefix=''):
+        return [
+            n for n in self.config_hashes.keys() if n.startswith(job_prefix)]
+
+    def is_unchanged(self, job_name, config_hash):
+        verified = self._verified.get(job_name)
+        return verified is not None and \
+            verified[0] == self.config_hashes.get(job_name) and \
+            verified[1] == config_hash
+
+    def set_created(self, job_name):
+        # the config hash of the new job is unknown
+        with self._lock:
+            self.config_hashes[job_name] = None
+
+    def set_unchanged(self, job_name, remote_job_config_bytes, config_hash):
+        remote_hash = hashlib.md5(remote_job_config_bytes).hexdigest()
+        with self._lock:
+            self._verified[job_name] = [remote_hash, config_hash]
+
+    def write(self):
+        if self._cache_file is None:
+            return
+        # only keep entries of jobs which still exist
+        with self._lock:
+            data = dict([
+                (k, v) for k, v in self._verified.items()
+                if k in self.config_hashes])
+        _write_json_file(
+            self._cache_file, {'version': self._version, 'jobs': data})
+
+
+def _read_json_file(filename):
+    # a missing or unreadable file, e.g. truncated by an interrupted write,
+    # is treated as empty
+    if not os.path.exists(filename):
+        return None
+    try:
+        with open(filename, 'r') as h:
+            return json.load(h)
+    except (IOError, ValueError) as e:
+        print("Ignoring unreadable file '%s': %s" % (filename, e),
+              file=sys.stderr)
+        return None
+
+
+def _write_json_file(filename, data):
+    dirname = os.path.dirname(filename)
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    # write to a temporary file first so that the file is replaced atomically
+    tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+    with open(tmp_filename, 'w') as h:
+        json.dump(data, h)
+    os.rename(tmp_filename, filename)
+
+
+def get_job_config_snapshot(jenkins):
+    from .git import get_hash
+    from .git import get_repository
+    repository = get_repository()
+    # the version might be a branch name, therefore include the commit hash
+    commit_hash = get_hash(os.path.dirname(os.path.dirname(__file__)))
+    version = '%s %s %s' % (repository.url, repository.version, commit_hash)
+
+    print('Fetching the config hashes of all jobs')
+    try:
+        snapshot = JobConfigSnapshot(
+            jenkins, cache_file=get_job_config_snapshot_path(jenkins.baseurl),
+            version=version)
+    except Exception as e:
+        print('Failed to fetch the config hashes, falling back to ' +
+              'per-job requests: %s' % e, file=sys.stderr)
+        return None
+    print('Found %d jobs' % len(snapshot.config_hashes))
+    return snapshot
+
+
+class JobConfigurator(object):
+
+    """
+    Configure jobs concurrently using a bounded pool of worker threads.
+
+    While the caller is still generating the configuration of further jobs
+    the already submitted jobs are being compared with and pushed to the
+    Jenkins master.
+    All workers share the connection pool and the crumb of the Jenkins
+    instance.
+
+    Either L{shutdown} or, if the caller fails while submitting jobs,
+    L{cancel} must be called to stop the workers.
+    """
+
+    def __init__(
+            self, jenkins, concurrency=DEFAULT_CONCURRENCY, retry=2,
+            retry_period=1, snapshot=None):
+        self._jenkins = jenkins
+        self._snapshot = snapshot
+        self._concurrency = max(1, min(concurrency, JENKINS_MAX_CONNECTIONS))
+        self._retry = retry
+        self._retry_period = retry_period
+        self._executor = ThreadPoolExecutor(max_workers=self._concurrency)
+        self._pending = set()
+        self._failed_job_names = []
+        # creating a job modifies the cached list of jobs
+        self._create_lock = threading.Lock()
+
+    def configure_job(self, job_name, job_config, view=None):
+        # limit the number of queued jobs to bound the memory usage
+        while len(self._pending) >= 2 * self._concurrency:
+            self._wait(return_when=FIRST_COMPLETED)
+        future = self._executor.submit(
+            self._configure_job, job_name, job_config, view)
+        future.job_name = job_name
+        self._pending.add(future)
+
+    def shutdown(self):
+        """Wait for all submitted jobs and raise if any of them failed."""
+        while self._pending:
+            self._wait()
+        self._executor.shutdown()
+        if self._failed_job_names:
+            raise RuntimeError(
+                'Failed to configure the following jobs: ' +
+                ', '.join(sorted(self._failed_job_names)))
+
+    def cancel(self):
+        """Cancel the pending jobs and wait for the running ones."""
+        for future in self._pending:
+            future.cancel()
+        self._pending = set()
+        self._executor.shutdown()
+
+    def _wait(self, return_when=None):
+        kwargs = {}
+        if return_when is not None:
+            kwargs['return_when'] = return_when
+        done, self._pending = wait(self._pending, **kwargs)
+        for future in done:
+            e = future.exception()
+            if e is not None:
+                print("Failed to configure job '%s': %s: %s" %
+                      (future.job_name, e.__class__.__name__, e),
+                      file=sys.stderr)
+                self._failed_job_names.append(future.job_name)
+
+    def _configure_job(self, job_name, job_config, view):
+        retry = self._retry
+        while True:
+            try:
+                # the existence is checked under the lock so that only one
+                # worker creates a job with a given name
+                with self._create_lock:
+                    if self._snapshot is not None:
+                        has_job = self._snapshot.has_job(job_name)
+                    else:
+                        has_job = self._jenkins.has_job(job_name)
+                    if not has_job:
+                        return configure_job(
+                            self._jenkins, job_name, job_config, view=view,
+                            snapshot=self._snapshot)
+                return configure_job(
+                    self._jenkins, job_name, job_config, view=view,
+                    snapshot=self._snapshot)
+            except (RequestException, JenkinsAPIException):
+                # only retry on errors communicating with the Jenkins master
+                if not retry:
+                    raise
+                retry -= 1
+                print("Retrying to configure job '%s'" % job_name,
+                      file=sys.stderr)
+                time.sleep(self._retry_period)
+
+
 def invoke_job(jenkins, job_name, cause=None):
     try:
         if not jenkins.has_job(job_name):
@@ -231,15 +557,175 @@ def invoke_job(jenkins, job_name, cause=None):
     return True
 
 
-def _diff_configs(remote_config, new_config):
-    remote_root = ElementTree.fromstring(remote_config)
-    new_root = ElementTree.fromstring(new_config)
+JobState = namedtuple('JobState', 'enabled queued running has_params')
 
+
+def get_job_states(jenkins):
+    """
+    Get the state of all jobs with a single request.
+
+    :return: a dict indexed by job names containing a `JobState`
+    """
+    response = jenkins.requester.get_url(
+        jenkins.baseurl + '/api/json', params={
+            'tree': 'jobs[name,color,inQueue,' +
+                    'property[parameterDefinitions[name]]]'})
+    if response.status_code != 200:
+        raise RuntimeError(
+            'Failed to fetch job states (%d): %s' %
+            (response.status_code, response.text))
+    states = {}
+    for job in response.json().get('jobs', []):
+        # the color of a job indicates if it is disabled or running
+        color = job.get('color') or ''
+        has_params = any(
+            p.get('parameterDefinitions') for p in job.get('property') or [])
+        states[job['name']] = JobState(
+            not color.startswith('disabled'), bool(job.get('inQueue')),
+            color.endswith('_anime'), has_params)
+    return states
+
+
+class JobTrigger(object):
+
+    """
+    Invoke jobs based on a snapshot of the state of all jobs.
+
+    The state of all jobs is fetched with a single request when the trigger
+    is created, instead of querying each job before invoking it.
+    The invocations are sent concurrently while limiting the number of
+    invocations per second.
+    """
+
+    def __init__(
+            self, jenkins, concurrency=DEFAULT_CONCURRENCY,
+            max_rate=DEFAULT_MAX_INVOCATION_RATE):
+        self._jenkins = jenkins
+        print('Fetching the state of all jobs')
+        self.job_states = get_job_states(jenkins)
+        print('Found %d jobs' % len(self.job_states))
+        self._concurrency = max(1, min(concurrency, JENKINS_MAX_CONNECTIONS))
+        self._executor = ThreadPoolExecutor(max_workers=self._concurrency)
+        self._futures = []
+        self._failed_job_names = []
+        self._interval = 1.0 / max_rate if max_rate else 0
+        self._next_invocation = 0
+        self._rate_lock = threading.Lock()
+
+    def invoke_job(self, job_name, cause=None):
+        """
+        Check the state of a job and submit its invocation.
+
+        :return: True if the job is being invoked, False if it can't be
+          invoked because it doesn't exist, is disabled, queued or running
+        """
+        state = self.job_states.get(job_name)
+        if state is None:
+            print("Failed to invoke job '%s' because it does not exist" %
+                  job_name, file=sys.stderr)
+            return False
+        if not state.enabled:
+            print("Failed to invoke job '%s' because it is disabled" %
+                  job_name, file=sys.stderr)
+            return False
+        if state.queued:
+            print("Skipped to invoke job '%s' because it is queued" %
+                  job_name, file=sys.stderr)
+            return False
+        if state.running:
+            print("Skipped to invoke job '%s' because it is running" %
+                  job_name, file=sys.stderr)
+            return False
+        future = self._executor.submit(
+            self._invoke_job, job_name, state, cause)
+        future.job_name = job_name
+        self._futures.append(future)
+        return True
+
+    def wait_for_jobs(self, job_names, poll_period=30):
+        """
+        Wait until none of the jobs is queued or running anymore.
+
+        Since finished jobs might trigger downstream jobs the jobs need to be
+        idle in two consecutive polls.
+        The state of all jobs is updated by every poll.
+        """
+        self._wait_for_invocations()
+        job_names = set(job_names)
+        idle_polls = 0
+        while idle_polls < 2:
+            time.sleep(poll_period)
+            self.job_states = get_job_states(self._jenkins)
+            busy_job_names = [
+                n for n in job_names
+                if n in self.job_states and
+                (self.job_states[n].queued or self.job_states[n].running)]
+            if busy_job_names:
+                print('Waiting for %d queued or running jobs' %
+                      len(busy_job_names))
+                idle_polls = 0
+            else:
+                idle_polls += 1
+
+    def shutdown(self):
+        """Wait for all invocations and raise if any of them failed."""
+        self._wait_for_invocations()
+        self._executor.shutdown()
+        if self._failed_job_names:
+            raise RuntimeError(
+                'Failed to invoke the following jobs: ' +
+                ', '.join(sorted(self._failed_job_names)))
+
+    def _wait_for_invocations(self):
+        for future in self._futures:
+            e = future.exception()
+            if e is not None:
+                print("Failed to invoke job '%s': %s: %s" %
+                      (future.job_name, e.__class__.__name__, e),
+                      file=sys.stderr)
+                self._failed_job_names.append(future.job_name)
+        self._futures = []
+
+    def _invoke_job(self, job_name, state, cause):
+        self._wait_for_rate_limit()
+        print("Invoking job '%s'" % job_name)
+        build_params = {}
+        if cause:
+            build_params['cause'] = cause
+        data = {'json': Job.mk_json_from_build_parameters(build_params)}
+        data.update(build_params)
+        url = '%s/job/%s/%s' % (
+            self._jenkins.baseurl, quote(job_name),
+            'buildWithParameters' if state.has_params else 'build')
+        self._jenkins.requester.post_and_confirm_status(
+            url, data=data, valid=[200, 201, 303], allow_redirects=False)
+
+    def _wait_for_rate_limit(self):
+        with self._rate_lock:
+            now = time.time()
+            invocation_time = max(now, self._next_invocation)
+            self._next_invocation = invocation_time + self._interval
+        if invocation_time > now:
+            time.sleep(invocation_time - now)
+
+
+def get_config_hash(config):
+    """Get a hash of the config ignoring the description."""
+    root = _get_normalized_config_root(config)
+    return hashlib.md5(ElementTree.tostring(root)).hexdigest()
+
+
+def _get_normalized_config_root(config):
+    root = ElementTree.fromstring(config)
     # ignore description which contains timestamp
-    if remote_root.find('description') is not None:
-        remote_root.find('description').text = ''
-    if new_root.find('description') is not None:
-        new_root.find('description').text = ''
+    if root.find('description') is not None:
+        root.find('description').text = ''
+    return root
+
+
+def _diff_configs(remote_config, new_config):
+    remote_root = _get_normalized_config_root(remote_config)
+    new_root = _get_normalized_config_root(new_config)
 
     if ElementTree.tostring(remote_root) == ElementTree.tostring(new_root):
         return []
@@ -253,8 +739,12 @@ def _diff_configs(remote_config, new_config):
         lines1, lines2, 'remote config', 'new config', n=0)
 
 
-def remove_jobs(jenkins, job_prefix, excluded_job_names):
-    for job_name in jenkins.jobs.keys():
+def remove_jobs(jenkins, job_prefix, excluded_job_names, snapshot=None):
+    if snapshot is not None:
+        job_names = snapshot.get_job_names(job_prefix)
+    else:
+        job_names = jenkins.jobs.keys()
+    for job_name in job_names:
         if not job_name.startswith(job_prefix):
             continue
         if job_name in excluded_job_names:
@@ -0,0 +1,79 @@
+from collections import namedtuple
+
+from ros_buildfarm.config import get_snapshot
+
+# the information extracted from a package manifest
+PackageManifest = namedtuple(
+    'PackageManifest', 'name version dependencies maintainers urls')
+Maintainer = namedtuple('Maintainer', 'name email')
+Url = namedtuple('Url', 'type url')
+
+# the dependency types relevant for building, running and testing a package
+DEPENDENCY_TYPES = (
+    'buildtool_depends', 'build_depends',
+    'buildtool_export_depends', 'build_export_depends',
+    'exec_depends', 'test_depends')
+
+
+def get_package_manifest(pkg_xml):
+    """
+    Get the information extracted from the content of a package manifest.
+
+    The result is cached by the hash of the content so that every manifest
+    is only parsed once per process.
+    If the environment variable `ROS_BUILDFARM_CONFIG_CACHE_DIR` is set the
+    result is also shared with other processes through the on-disk cache.
+
+    :raises: :exc:`catkin_pkg.package.InvalidPackage` if the manifest is
+      invalid
+    """
+    return get_snapshot(
+        ('PackageManifest', ), pkg_xml,
+        lambda: _parse_package_manifest(pkg_xml))
+
+
+def get_package_manifests(pkg_xmls):
+    """Get the manifest information for a dict of package manifests."""
+    return {
+        pkg_name: get_package_manifest(pkg_xml)
+        for pkg_name, pkg_xml in pkg_xmls.items()}
+
+
+def get_release_package_manifest(dist_cache, pkg_name):
+    """
+    Get the manifest information of a released package.
+
+    :returns: the manifest information or `None` if the distribution cache
+      doesn't contain a manifest for the package
+    """
+    pkg_xml = dist_cache.release_package_xmls.get(pkg_name)
+    if pkg_xml is None:
+        return None
+    return get_package_manifest(pkg_xml)
+
+
+def get_maintainer_emails(dist_cache, repo_name):
+    """Get the maintainer emails of all released packages of a repo."""
+    maintainer_emails = set([])
+    if dist_cache and repo_name in dist_cache.distribution_file.repositories:
+        repo = dist_cache.distribution_file.repositories[repo_name]
+        if repo.release_repository:
+            for pkg_name in repo.release_repository.package_names:
+                manifest = get_release_package_manifest(dist_cache, pkg_name)
+                if manifest is None:
+                    continue
+                maintainer_emails.update(
+                    m.email for m in manifest.maintainers)
+    return maintainer_emails
+
+
+def _parse_package_manifest(pkg_xml):
+    from catkin_pkg.package import parse_package_string
+    pkg = parse_package_string(pkg_xml)
+    dependencies = set([])
+    for dependency_type in DEPENDENCY_TYPES:
+        dependencies.update(d.name for d in getattr(pkg, dependency_type))
+    return PackageManifest(
+        pkg.name, pkg.version, frozenset(dependencies),
+        tuple(Maintainer(m.name, m.email) for m in pkg.maintainers),
+        tuple(Url(u.type, u.url) for u in pkg.urls))
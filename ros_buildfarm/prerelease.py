@@ -2,7 +2,8 @@ from __future__ import print_function
 
 import sys
 
-from catkin_pkg.package import parse_package_string
+from ros_buildfarm.dependency_graph import DependencyGraph
+from ros_buildfarm.package_manifest import get_package_manifests
 
 
 def add_overlay_arguments(parser):
@@ -40,71 +41,28 @@ def get_overlay_package_names(
         included_package_names, excluded_package_names, level,
         underlay_package_names, pkg_xmls, output=False):
     # parse all package xmls
-    pkgs = {}
-    for pkg_name in sorted(pkg_xmls.keys()):
-        try:
-            pkg = parse_package_string(pkg_xmls[pkg_name])
-        except Exception:
-            # TODO decide which errors to catch and what to do
-            raise
-        pkgs[pkg_name] = pkg
+    pkgs = get_package_manifests(pkg_xmls)
 
     assert set(included_package_names).issubset(set(pkgs.keys()))
 
-    # extract all first-level dependencies (except doc)
-    dependencies = {}
-    for pkg_name, pkg in pkgs.items():
-        all_depends = \
-            pkg.build_depends + pkg.buildtool_depends + \
-            pkg.build_export_depends + pkg.buildtool_export_depends + \
-            pkg.exec_depends + pkg.test_depends
-        dependencies[pkg_name] = \
-            set([d.name for d in all_depends]) & set(pkgs.keys())
-
-    # determine first-level reverse dependencies
-    reverse_dependencies = {}
-    for pkg_name in dependencies.keys():
-        reverse_dependencies[pkg_name] = set([])
-    for pkg_name, dep_names in dependencies.items():
-        for dep_name in dep_names:
-            reverse_dependencies[dep_name].add(pkg_name)
+    # index the first-level dependencies (except doc)
+    dependency_graph = DependencyGraph({
+        pkg_name: pkg.dependencies for pkg_name, pkg in pkgs.items()})
 
     # collect overlay package names based on underlay package names and level
-    overlay_package_names_from_level = set([])
-    if level < 0:
-        level = len(pkgs) - 1
-    next_level_pkg_names = underlay_package_names
-    for _ in range(level):
-        next_level_pkg_names = get_next_level_of_dependencies(
-            next_level_pkg_names, reverse_dependencies,
-            overlay_package_names_from_level | set(underlay_package_names))
-        if not next_level_pkg_names:
-            break
-        overlay_package_names_from_level |= next_level_pkg_names
+    overlay_package_names_from_level = \
+        dependency_graph.get_recursive_dependents(
+            underlay_package_names, max_depth=level if level >= 0 else None)
     print("Overlay packages based on dependency level: %d" %
           len(overlay_package_names_from_level), file=sys.stderr)
 
     # collect recursive dependencies of included pkg names
-    recursive_included_package_names = set(included_package_names)
-    next_level_pkg_names = included_package_names
-    for _ in range(len(pkgs) - 1):
-        next_level_pkg_names = get_next_level_of_dependencies(
-            next_level_pkg_names, dependencies,
-            recursive_included_package_names | set(included_package_names))
-        if not next_level_pkg_names:
-            break
-        recursive_included_package_names |= next_level_pkg_names
+    recursive_included_package_names = set(included_package_names) | \
+        dependency_graph.get_recursive_dependencies(included_package_names)
 
     # collect recursive reverse dependencies of underlay pkg names
-    recursive_underlay_package_names = set([])
-    next_level_pkg_names = underlay_package_names
-    for _ in range(len(pkgs) - 1):
-        next_level_pkg_names = get_next_level_of_dependencies(
-            next_level_pkg_names, reverse_dependencies,
-            recursive_underlay_package_names | set(underlay_package_names))
-        if not next_level_pkg_names:
-            break
-        recursive_underlay_package_names |= next_level_pkg_names
+    recursive_underlay_package_names = \
+        dependency_graph.get_recursive_dependents(underlay_package_names)
 
     # the packages between the included package names and the underlay
     overlay_package_names_from_included_package_names = \
@@ -115,12 +73,3 @@ def get_overlay_package_names(
 
     return overlay_package_names_from_level | \
         overlay_package_names_from_included_package_names
-
-
-def get_next_level_of_dependencies(names, dependencies, excludes):
-    next_level = set([])
-    for name in names:
-        if name not in dependencies:
-            continue
-        next_level |= (dependencies[name] - excludes)
-    return next_level
@@ -2,9 +2,6 @@ from __future__ import print_function
 
 import sys
 
-from rosdistro import get_distribution_cache
-from rosdistro import get_index
-
 from ros_buildfarm.common import get_binarydeb_job_name
 from ros_buildfarm.common import get_debian_package_name
 from ros_buildfarm.common import get_github_project_url
@@ -16,22 +13,32 @@ from ros_buildfarm.common import get_release_view_name
 from ros_buildfarm.common \
     import get_repositories_and_script_generating_key_files
 from ros_buildfarm.common import get_sourcedeb_job_name
+from ros_buildfarm.common import GroovyJobConfigs
 from ros_buildfarm.common import JobValidationError
+from ros_buildfarm.config import get_distribution_cache
 from ros_buildfarm.config import get_distribution_file
 from ros_buildfarm.config import get_index as get_config_index
 from ros_buildfarm.config import get_release_build_files
+from ros_buildfarm.config import get_rosdistro_index
+from ros_buildfarm.dependency_graph import get_release_dependency_graph
 from ros_buildfarm.git import get_repository
 from ros_buildfarm.jenkins import configure_job
 from ros_buildfarm.jenkins import configure_management_view
 from ros_buildfarm.jenkins import configure_view
 from ros_buildfarm.jenkins import connect
+from ros_buildfarm.jenkins import DEFAULT_CONCURRENCY
+from ros_buildfarm.jenkins import get_job_config_snapshot
+from ros_buildfarm.jenkins import JobConfigurator
 from ros_buildfarm.jenkins import remove_jobs
+from ros_buildfarm.package_manifest import get_maintainer_emails
+from ros_buildfarm.package_manifest import get_release_package_manifest
 from ros_buildfarm.templates import expand_template
 
 
 def configure_release_jobs(
         config_url, rosdistro_name, release_build_name,
-        append_timestamp=False, groovy_script=None):
+        append_timestamp=False, groovy_script=None,
+        concurrency=DEFAULT_CONCURRENCY):
     """
     Configure all Jenkins release jobs.
 
@@ -40,12 +47,15 @@ def configure_release_jobs(
 
     Additionally a job to import Debian packages into the Debian repository is
     created.
+
+    The jobs are being configured on the Jenkins master by up to
+    C{concurrency} concurrent workers.
     """
     config = get_config_index(config_url)
     build_files = get_release_build_files(config, rosdistro_name)
     build_file = build_files[release_build_name]
 
-    index = get_index(config.rosdistro_index_url)
+    index = get_rosdistro_index(config.rosdistro_index_url)
 
     # get targets
     platforms = []
@@ -75,27 +85,24 @@ def configure_release_jobs(
     dist_cache = None
     if build_file.notify_maintainers or \
             build_file.abi_incompatibility_assumed or \
+            build_file.jenkins_binary_job_priority_range or \
             explicitly_ignored_pkg_names:
         dist_cache = get_distribution_cache(index, rosdistro_name)
 
-    if explicitly_ignored_pkg_names:
-        # get direct dependencies from distro cache for each package
-        direct_dependencies = {}
-        for pkg_name in pkg_names:
-            direct_dependencies[pkg_name] = _get_direct_dependencies(
-                pkg_name, dist_cache, pkg_names) or set([])
+    dependency_graph = None
+    if dist_cache is not None:
+        dependency_graph = get_release_dependency_graph(dist_cache, pkg_names)
 
+    binary_job_priorities = None
+    if build_file.jenkins_binary_job_priority_range:
+        binary_job_priorities = get_binary_job_priorities(
+            build_file, dependency_graph)
+
+    if explicitly_ignored_pkg_names:
         # find recursive downstream deps for all explicitly ignored packages
-        ignored_pkg_names = set(explicitly_ignored_pkg_names)
-        while True:
-            implicitly_ignored_pkg_names = _get_downstream_package_names(
-                ignored_pkg_names, direct_dependencies)
-            if implicitly_ignored_pkg_names - ignored_pkg_names:
-                ignored_pkg_names |= implicitly_ignored_pkg_names
-                continue
-            break
         implicitly_ignored_pkg_names = \
-            ignored_pkg_names - explicitly_ignored_pkg_names
+            dependency_graph.get_recursive_dependents(
+                explicitly_ignored_pkg_names)
 
         if implicitly_ignored_pkg_names:
             print(('The following packages are being %s because their ' +
@@ -106,6 +113,13 @@ def configure_release_jobs(
             filtered_pkg_names = \
                 set(filtered_pkg_names) - implicitly_ignored_pkg_names
 
+    binary_job_dependency_graph = None
+    if build_file.abi_incompatibility_assumed:
+        binary_job_dependency_graph = get_binary_job_dependency_graph(
+            dist_file, dist_cache, dependency_graph,
+            filtered_pkg_names if build_file.skip_ignored_packages
+            else pkg_names)
+
     jenkins = connect(config.jenkins_url)
 
     configure_import_package_job(
@@ -130,54 +144,78 @@ def configure_release_jobs(
     views = configure_release_views(
         jenkins, rosdistro_name, release_build_name, targets)
 
+    job_configurator = None
+    snapshot = None
     if groovy_script is not None:
         # all further configuration will be handled by the groovy script
         jenkins = False
+    else:
+        snapshot = get_job_config_snapshot(jenkins)
+        job_configurator = JobConfigurator(
+            jenkins, concurrency=concurrency, snapshot=snapshot)
 
     all_source_job_names = []
     all_binary_job_names = []
-    all_job_configs = {}
-    for pkg_name in sorted(pkg_names):
-        pkg = dist_file.release_packages[pkg_name]
-        repo_name = pkg.repository_name
-        repo = dist_file.repositories[repo_name]
-        is_disabled = pkg_name not in filtered_pkg_names
-        if is_disabled and build_file.skip_ignored_packages:
-            print("Skipping ignored package '%s' in repository '%s'" %
-                  (pkg_name, repo_name), file=sys.stderr)
-            continue
-        if not repo.release_repository:
-            print(("Skipping package '%s' in repository '%s': no release " +
-                   "section") % (pkg_name, repo_name), file=sys.stderr)
-            continue
-        if not repo.release_repository.version:
-            print(("Skipping package '%s' in repository '%s': no release " +
-                   "version") % (pkg_name, repo_name), file=sys.stderr)
-            continue
+    all_job_configs = GroovyJobConfigs()
+    try:
+        for pkg_name in sorted(pkg_names):
+            pkg = dist_file.release_packages[pkg_name]
+            repo_name = pkg.repository_name
+            repo = dist_file.repositories[repo_name]
+            is_disabled = pkg_name not in filtered_pkg_names
+            if is_disabled and build_file.skip_ignored_packages:
+                print("Skipping ignored package '%s' in repository '%s'" %
+                      (pkg_name, repo_name), file=sys.stderr)
+                continue
+            if not repo.release_repository:
+                print(("Skipping package '%s' in repository '%s': no " +
+                       "release section") % (pkg_name, repo_name),
+                      file=sys.stderr)
+                continue
+            if not repo.release_repository.version:
+                print(("Skipping package '%s' in repository '%s': no " +
+                       "release version") % (pkg_name, repo_name),
+                      file=sys.stderr)
+                continue
 
-        for os_name, os_code_name in platforms:
-            try:
-                source_job_names, binary_job_names, job_configs = \
-                    configure_release_job(
-                        config_url, rosdistro_name, release_build_name,
-                        pkg_name, os_name, os_code_name,
-                        append_timestamp=append_timestamp,
-                        config=config, build_file=build_file,
-                        index=index, dist_file=dist_file,
-                        dist_cache=dist_cache,
-                        jenkins=jenkins, views=views,
-                        generate_import_package_job=False,
-                        generate_sync_packages_jobs=False,
-                        is_disabled=is_disabled,
-                        groovy_script=groovy_script)
-                all_source_job_names += source_job_names
-                all_binary_job_names += binary_job_names
-                if groovy_script is not None:
-                    print('Configuration for jobs: ' +
-                          ', '.join(source_job_names + binary_job_names))
-                    all_job_configs.update(job_configs)
-            except JobValidationError as e:
-                print(e.message, file=sys.stderr)
+            for os_name, os_code_name in platforms:
+                try:
+                    source_job_names, binary_job_names, job_configs = \
+                        configure_release_job(
+                            config_url, rosdistro_name, release_build_name,
+                            pkg_name, os_name, os_code_name,
+                            append_timestamp=append_timestamp,
+                            config=config, build_file=build_file,
+                            index=index, dist_file=dist_file,
+                            dist_cache=dist_cache,
+                            jenkins=jenkins, views=views,
+                            generate_import_package_job=False,
+                            generate_sync_packages_jobs=False,
+                            is_disabled=is_disabled,
+                            groovy_script=groovy_script,
+                            job_configurator=job_configurator,
+                            binary_job_priorities=binary_job_priorities,
+                            dependency_graph=dependency_graph,
+                            binary_job_dependency_graph=(
+                                binary_job_dependency_graph))
+                    all_source_job_names += source_job_names
+                    all_binary_job_names += binary_job_names
+                    if groovy_script is not None:
+                        print('Configuration for jobs: ' +
+                              ', '.join(source_job_names + binary_job_names))
+                        for job_name in source_job_names + binary_job_names:
+                            all_job_configs.add(
+                                job_name, job_configs[job_name])
+                except JobValidationError as e:
+                    print(e.message, file=sys.stderr)
+    except BaseException:
+        if job_configurator is not None:
+            # stop the workers before propagating the error
+            job_configurator.cancel()
+        raise
+
+    if job_configurator is not None:
+        job_configurator.shutdown()
 
     groovy_data = {
         'job_configs': all_job_configs,
@@ -199,7 +237,8 @@ def configure_release_jobs(
                 print("Removing obsolete binary jobs with prefix '%s'" %
                       binary_job_prefix)
                 remove_jobs(
-                    jenkins, binary_job_prefix, excluded_job_names)
+                    jenkins, binary_job_prefix, excluded_job_names,
+                    snapshot=snapshot)
             else:
                 binary_key = 'binary_%s_%s_%s' % (os_name, os_code_name, arch)
                 groovy_data['job_prefixes_and_names'][binary_key] = \
@@ -250,12 +289,17 @@ def configure_release_jobs(
         if groovy_script is None:
             print("Removing obsolete source jobs with prefix '%s'" %
                   source_job_prefix)
-            remove_jobs(jenkins, source_job_prefix, excluded_job_names)
+            remove_jobs(
+                jenkins, source_job_prefix, excluded_job_names,
+                snapshot=snapshot)
         else:
             source_key = 'source_%s_%s' % (os_name, os_code_name)
             groovy_data['job_prefixes_and_names'][source_key] = (
                 source_job_prefix, excluded_job_names)
 
+    if snapshot is not None:
+        snapshot.write()
+
     if groovy_script is not None:
         print("Writing groovy script '%s' to reconfigure %d jobs" %
               (groovy_script, len(all_job_configs)))
@@ -265,14 +309,6 @@ def configure_release_jobs(
             h.write(content)
 
 
-def _get_downstream_package_names(pkg_names, dependencies):
-    downstream_pkg_names = set([])
-    for pkg_name, deps in dependencies.items():
-        if deps.intersection(pkg_names):
-            downstream_pkg_names.add(pkg_name)
-    return downstream_pkg_names
-
-
 # Configure a Jenkins release job which consists of
 # - a source deb job
 # - N binary debs, one for each archicture
@@ -286,13 +322,33 @@ def configure_release_job(
         generate_sync_packages_jobs=True,
         is_disabled=False,
         groovy_script=None,
-        filter_arches=None):
+        filter_arches=None,
+        job_configurator=None,
+        binary_job_priorities=None,
+        dependency_graph=None,
+        binary_job_dependency_graph=None):
     """
     Configure a Jenkins release job.
 
     The following jobs are created for each package:
     - M source jobs, one for each OS node name
     - M * N binary jobs, one for each combination of OS code name and arch
+
+    If a C{job_configurator} is passed the jobs are submitted to it instead of
+    being configured synchronously.
+    If the priorities of binary jobs are derived from the dependency graph
+    C{binary_job_priorities} can pass the result of
+    L{get_binary_job_priorities} to avoid computing it for every package.
+    The same applies to the C{dependency_graph} of the released packages
+    and the C{binary_job_dependency_graph} from
+    L{get_binary_job_dependency_graph}.
+
+    If ABI incompatibility is assumed the upstream projects of each binary
+    job are limited to the transitive reduction of the dependencies between
+    the packages with binary jobs.
+    Jenkins considers transitive upstream projects when blocking builds and
+    triggers the jobs of the omitted dependencies through the remaining
+    chain, therefore the redundant edges only cause additional triggers.
     """
     if config is None:
         config = get_config_index(config_url)
@@ -301,7 +357,7 @@ def configure_release_job(
         build_file = build_files[release_build_name]
 
     if index is None:
-        index = get_index(config.rosdistro_index_url)
+        index = get_rosdistro_index(config.rosdistro_index_url)
     if dist_file is None:
         dist_file = get_distribution_file(index, rosdistro_name, build_file)
         if not dist_file:
@@ -341,7 +397,8 @@ def configure_release_job(
 
     if dist_cache is None and \
             (build_file.notify_maintainers or
-             build_file.abi_incompatibility_assumed):
+             build_file.abi_incompatibility_assumed or
+             build_file.jenkins_binary_job_priority_range):
         dist_cache = get_distribution_cache(index, rosdistro_name)
     if jenkins is None:
         jenkins = connect(config.jenkins_url)
@@ -382,22 +439,47 @@ def configure_release_job(
         config, build_file, os_name, os_code_name,
         pkg_name, repo_name, repo.release_repository, dist_cache=dist_cache,
         is_disabled=is_disabled)
+    if job_configurator is not None:
+        job_configurator.configure_job(source_job_name, job_config)
     # jenkinsapi.jenkins.Jenkins evaluates to false if job count is zero
-    if isinstance(jenkins, object) and jenkins is not False:
+    elif isinstance(jenkins, object) and jenkins is not False:
         configure_job(jenkins, source_job_name, job_config)
     source_job_names.append(source_job_name)
     job_configs[source_job_name] = job_config
 
+    if dependency_graph is None and \
+            (build_file.abi_incompatibility_assumed or
+             build_file.jenkins_binary_job_priority_range):
+        dependency_graph = get_release_dependency_graph(dist_cache, pkg_names)
+
     dependency_names = []
     if build_file.abi_incompatibility_assumed:
-        dependency_names = _get_direct_dependencies(
-            pkg_name, dist_cache, pkg_names)
         # if dependencies are not yet available in rosdistro cache
         # skip binary jobs
-        if dependency_names is None:
+        if get_release_package_manifest(dist_cache, pkg_name) is None:
             print(("Skipping binary jobs for package '%s' because it is not " +
                    "yet in the rosdistro cache") % pkg_name, file=sys.stderr)
-            return source_job_names, binary_job_names
+            return source_job_names, binary_job_names, job_configs
+        if binary_job_dependency_graph is None:
+            job_pkg_names = set(pkg_names)
+            if build_file.skip_ignored_packages:
+                ignored_pkg_names = \
+                    job_pkg_names - set(build_file.filter_packages(pkg_names))
+                job_pkg_names -= ignored_pkg_names | \
+                    dependency_graph.get_recursive_dependents(
+                        ignored_pkg_names)
+            job_pkg_names.add(pkg_name)
+            binary_job_dependency_graph = get_binary_job_dependency_graph(
+                dist_file, dist_cache, dependency_graph, job_pkg_names)
+        dependency_names = sorted(
+            binary_job_dependency_graph.get_reduced_dependencies(pkg_name))
+
+    binary_job_priority = build_file.jenkins_binary_job_priority
+    if build_file.jenkins_binary_job_priority_range:
+        if binary_job_priorities is None:
+            binary_job_priorities = get_binary_job_priorities(
+                build_file, dependency_graph)
+        binary_job_priority = binary_job_priorities[pkg_name]
 
     # binarydeb jobs
     for arch in build_file.targets[os_name][os_code_name]:
@@ -419,9 +501,11 @@ def configure_release_job(
             config, build_file, os_name, os_code_name, arch,
             pkg_name, append_timestamp, repo_name, repo.release_repository,
             dist_cache=dist_cache, upstream_job_names=upstream_job_names,
-            is_disabled=is_disabled)
+            is_disabled=is_disabled, job_priority=binary_job_priority)
+        if job_configurator is not None:
+            job_configurator.configure_job(job_name, job_config)
         # jenkinsapi.jenkins.Jenkins evaluates to false if job count is zero
-        if isinstance(jenkins, object) and jenkins is not False:
+        elif isinstance(jenkins, object) and jenkins is not False:
             configure_job(jenkins, job_name, job_config)
         binary_job_names.append(job_name)
         job_configs[job_name] = job_config
@@ -456,22 +540,56 @@ def configure_release_views(
     return views
 
 
-def _get_direct_dependencies(pkg_name, dist_cache, pkg_names):
-    from catkin_pkg.package import parse_package_string
-    if pkg_name not in dist_cache.release_package_xmls:
-        return None
-    pkg_xml = dist_cache.release_package_xmls[pkg_name]
-    pkg = parse_package_string(pkg_xml)
-    depends = set([
-        d.name for d in (
-            pkg.buildtool_depends +
-            pkg.build_depends +
-            pkg.buildtool_export_depends +
-            pkg.build_export_depends +
-            pkg.exec_depends +
-            pkg.test_depends)
-        if d.name in pkg_names])
-    return depends
+def get_binary_job_dependency_graph(
+        dist_file, dist_cache, dependency_graph, pkg_names):
+    """
+    Get the dependency graph between the packages which get binary jobs.
+
+    Packages without a release version or which are not yet in the
+    distribution cache get no binary jobs.
+    Reducing the dependencies within this graph keeps dependencies which are
+    only implied through a package without binary jobs.
+
+    :param dependency_graph: the L{DependencyGraph} of the released packages
+    :param pkg_names: the names of the packages for which jobs are generated
+    """
+    binary_pkg_names = []
+    for pkg_name in pkg_names:
+        repo = dist_file.repositories[
+            dist_file.release_packages[pkg_name].repository_name]
+        if not repo.release_repository or \
+                not repo.release_repository.version:
+            continue
+        if get_release_package_manifest(dist_cache, pkg_name) is None:
+            continue
+        binary_pkg_names.append(pkg_name)
+    return dependency_graph.get_subgraph(binary_pkg_names)
+
+
+def get_binary_job_priorities(build_file, dependency_graph):
+    """
+    Get the priorities of the binary jobs based on the dependency graph.
+
+    The priority of each package is lowered (which means it is scheduled
+    earlier) proportional to the length of the longest chain of packages
+    depending on it, by at most C{jenkins_binary_job_priority_range}.
+
+    :param dependency_graph: the L{DependencyGraph} of the released packages
+    :returns: a dict mapping package names to priorities
+    """
+    chain_lengths = dependency_graph.get_downstream_chain_lengths()
+    max_chain_length = max(chain_lengths.values() or [0])
+    priorities = {}
+    for pkg_name, chain_length in chain_lengths.items():
+        offset = 0
+        if max_chain_length:
+            offset = int(round(
+                build_file.jenkins_binary_job_priority_range *
+                chain_length / float(max_chain_length)))
+        # the priority sorter plugin doesn't support priorities below one
+        priorities[pkg_name] = max(
+            1, build_file.jenkins_binary_job_priority - offset)
+    return priorities
 
 
 def _get_sourcedeb_job_config(
@@ -539,7 +657,7 @@ def _get_binarydeb_job_config(
         config, build_file, os_name, os_code_name, arch,
         pkg_name, append_timestamp, repo_name, release_repository,
         dist_cache=None, upstream_job_names=None,
-        is_disabled=False):
+        is_disabled=False, job_priority=None):
     template_name = 'release/binarydeb_job.xml.em'
 
     repository_args, script_generating_key_files = \
@@ -560,7 +678,9 @@ def _get_binarydeb_job_config(
     job_data = {
         'github_url': get_github_project_url(release_repository.url),
 
-        'job_priority': build_file.jenkins_binary_job_priority,
+        'job_priority': job_priority
+        if job_priority is not None
+        else build_file.jenkins_binary_job_priority,
         'node_label': build_file.jenkins_binary_job_label,
 
         'disabled': is_disabled,
@@ -728,20 +848,3 @@ def _get_sync_packages_to_main_job_config(rosdistro_name, build_file):
     }
     job_config = expand_template(template_name, job_data)
     return job_config
-
-
-def get_maintainer_emails(dist_cache, repo_name):
-    maintainer_emails = set([])
-    if dist_cache and repo_name in dist_cache.distribution_file.repositories:
-        from catkin_pkg.package import parse_package_string
-        # add maintainers listed in latest release to recipients
-        repo = dist_cache.distribution_file.repositories[repo_name]
-        if repo.release_repository:
-            for pkg_name in repo.release_repository.package_names:
-                if pkg_name not in dist_cache.release_package_xmls:
-                    continue
-                pkg_xml = dist_cache.release_package_xmls[pkg_name]
-                pkg = parse_package_string(pkg_xml)
-                for m in pkg.maintainers:
-                    maintainer_emails.add(m.email)
-    return maintainer_emails
@@ -0,0 +1,392 @@
+from collections import deque
+from collections import namedtuple
+from collections import OrderedDict
+import csv
+import heapq
+import statistics
+
+from .common import get_binarydeb_job_name
+from .common import get_sourcedeb_job_name
+from .config import get_distribution_cache
+from .config import get_distribution_file
+from .config import get_index as get_config_index
+from .config import get_release_build_files
+from .config import get_rosdistro_index
+from .dependency_graph import get_release_dependency_graph
+from .package_manifest import get_release_package_manifest
+from .release_job import get_binary_job_dependency_graph
+from .release_job import get_binary_job_priorities
+from .release_job import get_import_package_job_name
+from .release_job import get_sync_packages_to_testing_job_name
+
+# the label of the jobs updating the Debian repository
+REPOSITORY_LABEL = 'building_repository'
+# the label of jobs without an explicit label
+DEFAULT_LABEL = 'buildslave'
+# the priority of jobs without an explicit priority
+DEFAULT_PRIORITY = 50
+
+# the durations in seconds of jobs without historical timings
+DEFAULT_DURATIONS = {
+    'source': 300,
+    'binary': 900,
+    'import': 30,
+    'sync': 300,
+}
+
+QueueSample = namedtuple('QueueSample', 'time queued running')
+SimulationResult = namedtuple(
+    'SimulationResult',
+    'makespan executors busy_times samples unfinished_job_names')
+
+
+class SimulatedJob(object):
+
+    """
+    A job of the simulated build farm.
+
+    Source and binary jobs run once after all their upstream jobs finished
+    and block their executor until the import of the built packages
+    finished.
+    Sync jobs run after any of their upstream jobs finished as soon as none
+    of their upstream jobs is queued or running anymore.
+    """
+
+    def __init__(
+            self, name, kind, label, duration, priority,
+            upstream_job_names=None):
+        self.name = name
+        self.kind = kind
+        self.label = label
+        self.duration = duration
+        self.priority = priority
+        self.upstream_job_names = upstream_job_names or []
+        self.sequence = None
+
+
+def read_job_durations(path):
+    """
+    Read the historical durations of jobs from a CSV file.
+
+    The file must have a header with the columns `job_name` and `duration`
+    (in seconds).
+    If a job has multiple rows the median of their durations is used.
+
+    :returns: a dict mapping job names to durations in seconds
+    """
+    durations = {}
+    with open(path, 'r') as h:
+        for row in csv.DictReader(h):
+            durations.setdefault(row['job_name'], []).append(
+                float(row['duration']))
+    return {
+        job_name: statistics.median(values)
+        for job_name, values in durations.items()}
+
+
+def get_simulated_release_jobs(
+        config_url, rosdistro_name, release_build_name,
+        durations=None, default_durations=None):
+    """
+    Get the jobs involved in a full rebuild of a release build file.
+
+    The jobs mirror the ones generated by
+    L{ros_buildfarm.release_job.configure_release_jobs}: one source job per
+    package and platform, one binary job per package and target, the import
+    job and one sync-to-testing job per target.
+    Ignored packages as well as packages depending on them are not part of
+    the rebuild.
+
+    :param durations: a dict mapping job names to durations in seconds
+    :param default_durations: a dict mapping the job kinds to the durations
+      of jobs without an entry in C{durations}, see L{DEFAULT_DURATIONS}
+    :returns: a list of L{SimulatedJob}s
+    """
+    durations = durations or {}
+    default_durations = dict(DEFAULT_DURATIONS, **(default_durations or {}))
+
+    def get_duration(job_name, kind):
+        return durations.get(job_name, default_durations[kind])
+
+    config = get_config_index(config_url)
+    build_files = get_release_build_files(config, rosdistro_name)
+    build_file = build_files[release_build_name]
+
+    index = get_rosdistro_index(config.rosdistro_index_url)
+    dist_file = get_distribution_file(index, rosdistro_name, build_file)
+    if not dist_file:
+        raise RuntimeError('No distribution file matches the build file')
+    dist_cache = get_distribution_cache(index, rosdistro_name)
+
+    pkg_names = dist_file.release_packages.keys()
+    dependency_graph = get_release_dependency_graph(dist_cache, pkg_names)
+    filtered_pkg_names = set(build_file.filter_packages(pkg_names))
+    filtered_pkg_names -= dependency_graph.get_recursive_dependents(
+        set(pkg_names) - filtered_pkg_names)
+    built_pkg_names = set([])
+    for pkg_name in filtered_pkg_names:
+        repo = dist_file.repositories[
+            dist_file.release_packages[pkg_name].repository_name]
+        if repo.release_repository and repo.release_repository.version:
+            built_pkg_names.add(pkg_name)
+
+    # the upstream binary jobs of the binary job of each package
+    binary_job_dependency_graph = get_binary_job_dependency_graph(
+        dist_file, dist_cache, dependency_graph, built_pkg_names)
+    reduced_dependencies = dict(
+        (n, binary_job_dependency_graph.get_reduced_dependencies(n))
+        for n in binary_job_dependency_graph.names)
+
+    binary_job_priorities = {}
+    if build_file.jenkins_binary_job_priority_range:
+        binary_job_priorities = get_binary_job_priorities(
+            build_file, dependency_graph)
+    source_priority = build_file.jenkins_source_job_priority
+    if source_priority is None:
+        source_priority = DEFAULT_PRIORITY
+    binary_priority = build_file.jenkins_binary_job_priority
+    if binary_priority is None:
+        binary_priority = DEFAULT_PRIORITY
+
+    import_job_name = get_import_package_job_name(rosdistro_name)
+    jobs = [SimulatedJob(
+        import_job_name, 'import', REPOSITORY_LABEL,
+        get_duration(import_job_name, 'import'), DEFAULT_PRIORITY)]
+    for os_name in sorted(build_file.targets.keys()):
+        for os_code_name in sorted(build_file.targets[os_name].keys()):
+            source_job_names = {}
+            for pkg_name in sorted(built_pkg_names):
+                job_name = get_sourcedeb_job_name(
+                    rosdistro_name, release_build_name,
+                    pkg_name, os_name, os_code_name)
+                jobs.append(SimulatedJob(
+                    job_name, 'source',
+                    build_file.jenkins_source_job_label or DEFAULT_LABEL,
+                    get_duration(job_name, 'source'), source_priority))
+                source_job_names[pkg_name] = job_name
+
+            for arch in sorted(build_file.targets[os_name][os_code_name]):
+                binary_job_names = []
+                for pkg_name in sorted(built_pkg_names):
+                    dependency_names = []
+                    if build_file.abi_incompatibility_assumed:
+                        if get_release_package_manifest(
+                                dist_cache, pkg_name) is None:
+                            continue
+                        dependency_names = sorted(
+                            reduced_dependencies[pkg_name])
+                    job_name = get_binarydeb_job_name(
+                        rosdistro_name, release_build_name,
+                        pkg_name, os_name, os_code_name, arch)
+                    upstream_job_names = [source_job_names[pkg_name]] + [
+                        get_binarydeb_job_name(
+                            rosdistro_name, release_build_name,
+                            dependency_name, os_name, os_code_name, arch)
+                        for dependency_name in dependency_names]
+                    jobs.append(SimulatedJob(
+                        job_name, 'binary',
+                        build_file.jenkins_binary_job_label or DEFAULT_LABEL,
+                        get_duration(job_name, 'binary'),
+                        binary_job_priorities.get(pkg_name, binary_priority),
+                        upstream_job_names=upstream_job_names))
+                    binary_job_names.append(job_name)
+
+                job_name = get_sync_packages_to_testing_job_name(
+                    rosdistro_name, os_code_name, arch)
+                jobs.append(SimulatedJob(
+                    job_name, 'sync', REPOSITORY_LABEL,
+                    get_duration(job_name, 'sync'), DEFAULT_PRIORITY,
+                    upstream_job_names=binary_job_names))
+    return jobs
+
+
+def simulate_jobs(jobs, executors, sample_interval=600):
+    """
+    Simulate a full rebuild of the passed jobs.
+
+    All source jobs are triggered at the beginning.
+    The Jenkins queue assigns idle executors of the matching label to
+    buildable jobs ordered by their priority (lower values first) and the
+    time they have been triggered.
+    Jobs which are blocked by an upstream job are queued but not
+    buildable.
+    The import job is not concurrent, therefore only one import runs at a
+    time.
+
+    :param jobs: a list of L{SimulatedJob}s containing at most one import
+      job
+    :param executors: a dict mapping labels to the number of executors
+    :param sample_interval: the interval in seconds between the samples of
+      the queue depth and the running jobs
+    :returns: a L{SimulationResult}
+    """
+    missing_labels = set(job.label for job in jobs) - set(executors.keys())
+    if missing_labels:
+        raise ValueError(
+            'No executors for the labels: ' +
+            ', '.join(sorted(missing_labels)))
+
+    jobs_by_name = OrderedDict((job.name, job) for job in jobs)
+    import_jobs = [job for job in jobs if job.kind == 'import']
+    assert len(import_jobs) <= 1
+    import_job = import_jobs[0] if import_jobs else None
+
+    # the jobs triggered by the completion of each job
+    downstream_jobs = {name: [] for name in jobs_by_name.keys()}
+    # the number of upstream jobs a source or binary job is waiting for
+    remaining_upstream = {}
+    # the number of queued or running upstream jobs blocking a sync job
+    active_upstream = {}
+    for job in jobs:
+        upstream_job_names = [
+            n for n in job.upstream_job_names if n in jobs_by_name]
+        for upstream_job_name in upstream_job_names:
+            downstream_jobs[upstream_job_name].append(job)
+        if job.kind == 'sync':
+            active_upstream[job.name] = 0
+        else:
+            remaining_upstream[job.name] = len(upstream_job_names)
+    # sync jobs are transitively blocked by the source jobs of their binary
+    # jobs as well
+    blocked_sync_jobs = {name: set([]) for name in jobs_by_name.keys()}
+    for job in jobs:
+        if job.kind != 'sync':
+            continue
+        for upstream_job_name in job.upstream_job_names:
+            blocked_sync_jobs[upstream_job_name].add(job)
+            for name in jobs_by_name[upstream_job_name].upstream_job_names:
+                if jobs_by_name[name].kind == 'source':
+                    blocked_sync_jobs[name].add(job)
+
+    time = 0
+    sequence = [0]
+    events = []
+    ready = {label: [] for label in executors.keys()}
+    idle = dict(executors)
+    busy_times = {label: 0 for label in executors.keys()}
+    running = {label: 0 for label in executors.keys()}
+    queued = set([])
+    queued_sync_jobs = set([])
+    running_sync_jobs = set([])
+    finished_job_names = set([])
+    # the jobs waiting for the import of their packages
+    import_queue = deque()
+    import_running = [False]
+    samples = []
+
+    def next_sequence():
+        sequence[0] += 1
+        return sequence[0]
+
+    def enqueue(job):
+        queued.add(job.name)
+        for sync_job in blocked_sync_jobs[job.name]:
+            active_upstream[sync_job.name] += 1
+        job.sequence = next_sequence()
+        if job.kind == 'sync':
+            queued_sync_jobs.add(job.name)
+            if not active_upstream[job.name]:
+                heapq.heappush(
+                    ready[job.label], (job.priority, job.sequence, job))
+        elif not remaining_upstream[job.name]:
+            heapq.heappush(
+                ready[job.label], (job.priority, job.sequence, job))
+
+    def release(job):
+        # the job is neither queued nor running anymore
+        for sync_job in blocked_sync_jobs[job.name]:
+            active_upstream[sync_job.name] -= 1
+            if not active_upstream[sync_job.name] and \
+                    sync_job.name in queued_sync_jobs:
+                heapq.heappush(
+                    ready[sync_job.label],
+                    (sync_job.priority, sync_job.sequence, sync_job))
+
+    def start(job, label, duration, event):
+        idle[label] -= 1
+        running[label] += 1
+        heapq.heappush(events, (time + duration, next_sequence(), event, job))
+
+    def schedule():
+        if import_job is not None and import_queue and \
+                not import_running[0] and idle[import_job.label]:
+            # imports are queued individually but only run one at a time
+            owner = import_queue.popleft()
+            import_running[0] = True
+            start(owner, import_job.label, import_job.duration, 'import')
+        for label, ready_jobs in ready.items():
+            while ready_jobs and idle[label]:
+                _, _, job = heapq.heappop(ready_jobs)
+                if job.kind == 'sync':
+                    if job.name not in queued_sync_jobs or \
+                            job.name in running_sync_jobs or \
+                            active_upstream[job.name]:
+                        continue
+                    queued_sync_jobs.remove(job.name)
+                    running_sync_jobs.add(job.name)
+                queued.discard(job.name)
+                start(job, label, job.duration, 'build')
+
+    def finish(job):
+        running[job.label] -= 1
+        idle[job.label] += 1
+        finished_job_names.add(job.name)
+        release(job)
+        if job.kind == 'sync':
+            running_sync_jobs.remove(job.name)
+            if job.name in queued_sync_jobs and \
+                    not active_upstream[job.name]:
+                heapq.heappush(
+                    ready[job.label], (job.priority, job.sequence, job))
+        for downstream_job in downstream_jobs[job.name]:
+            if downstream_job.kind == 'sync':
+                if downstream_job.name not in queued_sync_jobs:
+                    enqueue(downstream_job)
+                continue
+            remaining_upstream[downstream_job.name] -= 1
+            if downstream_job.name not in queued:
+                enqueue(downstream_job)
+            elif not remaining_upstream[downstream_job.name]:
+                heapq.heappush(
+                    ready[downstream_job.label],
+                    (downstream_job.priority, downstream_job.sequence,
+                     downstream_job))
+
+    for job in jobs:
+        if job.kind == 'source':
+            enqueue(job)
+    schedule()
+    next_sample_time = 0
+    while events:
+        event_time = events[0][0]
+        while next_sample_time <= event_time:
+            samples.append(QueueSample(
+                next_sample_time, len(queued) + len(import_queue),
+                dict(running)))
+            next_sample_time += sample_interval
+        # executors waiting for an import are busy as well
+        for label, count in running.items():
+            busy_times[label] += count * (event_time - time)
+        time = event_time
+        while events and events[0][0] == time:
+            _, _, event, job = heapq.heappop(events)
+            if event == 'import':
+                import_running[0] = False
+                running[import_job.label] -= 1
+                idle[import_job.label] += 1
+                finish(job)
+            elif job.kind in ('source', 'binary') and import_job is not None:
+                # the job keeps its executor while waiting for the import
+                import_queue.append(job)
+            else:
+                finish(job)
+        schedule()
+    samples.append(QueueSample(
+        time, len(queued) + len(import_queue), dict(running)))
+
+    unfinished_job_names = [
+        name for name, job in jobs_by_name.items()
+        if job.kind in ('source', 'binary') and
+        name not in finished_job_names]
+    return SimulationResult(
+        time, dict(executors), busy_times, samples, unfinished_job_names)
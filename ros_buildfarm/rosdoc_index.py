@@ -2,6 +2,8 @@ from collections import ChainMap
 import os
 import yaml
 
+from ros_buildfarm.config.loader import load_yaml
+
 
 class RosdocIndex(object):
 
@@ -40,14 +42,41 @@ class RosdocIndex(object):
         return recursive_deps
 
     def set_forward_deps(self, key, deps):
-        self.forward_deps[key] = deps
-        self._build_reverse_deps()
+        self.update_forward_deps({key: deps})
+
+    def update_forward_deps(self, forward_deps):
+        """
+        Set the dependencies of multiple packages.
+
+        Only the edges of the passed packages are updated in the reverse
+        dependencies instead of rebuilding them from all packages.
+        """
+        for key, deps in forward_deps.items():
+            _remove_edges(
+                self.reverse_deps, key, self.forward_deps.get(key))
+            self.forward_deps[key] = deps
+            _add_edges(self.reverse_deps, key, deps)
 
     def set_metapackage_deps(self, key, deps):
-        self.metapackage_deps[key] = deps
-        if deps is None:
-            del self.metapackage_deps[key]
-        self._build_metapackage_index()
+        self.update_metapackage_deps({key: deps})
+
+    def update_metapackage_deps(self, metapackage_deps):
+        """
+        Set the dependencies of multiple metapackages.
+
+        Passing `None` as the dependencies of a package removes the added /
+        modified entry of that package.
+        Only the edges of the passed packages are updated in the metapackage
+        index instead of rebuilding it from all packages.
+        """
+        for key, deps in metapackage_deps.items():
+            _remove_edges(
+                self.metapackage_index, key, self.metapackage_deps.get(key))
+            self.metapackage_deps[key] = deps
+            if deps is None:
+                del self.metapackage_deps[key]
+            _add_edges(
+                self.metapackage_index, key, self.metapackage_deps.get(key))
 
     def write_modified_data(self, path, folder_names=None):
         all_folder_names = ['deps', 'metapackage_deps', 'locations', 'hashes']
@@ -77,7 +106,7 @@ class RosdocIndex(object):
             if os.path.exists(path):
                 for key in os.listdir(path):
                     with open(os.path.join(path, key), 'r') as h:
-                        data[key] = yaml.load(h)
+                        data[key] = load_yaml(h)
             maps.append(data)
         return ChainMap(*maps)
 
@@ -100,11 +129,26 @@ class RosdocIndex(object):
     def _build_metapackage_index(self):
         self.metapackage_index = {}
         for pkg_name, deps in self.metapackage_deps.items():
-            for dep in deps:
-                self.metapackage_index.setdefault(dep, []).append(pkg_name)
+            _add_edges(self.metapackage_index, pkg_name, deps)
 
     def _build_reverse_deps(self):
         self.reverse_deps = {}
         for pkg_name, deps in self.forward_deps.items():
-            for dep in deps:
-                self.reverse_deps.setdefault(dep, []).append(pkg_name)
+            _add_edges(self.reverse_deps, pkg_name, deps)
+
+
+# add the edges from a package to its dependencies to a reverse index
+def _add_edges(index, pkg_name, deps):
+    for dep in deps or []:
+        index.setdefault(dep, []).append(pkg_name)
+
+
+# remove the edges from a package to its dependencies from a reverse index
+def _remove_edges(index, pkg_name, deps):
+    for dep in deps or []:
+        pkg_names = index.get(dep)
+        if pkg_names is None or pkg_name not in pkg_names:
+            continue
+        pkg_names.remove(pkg_name)
+        if not pkg_names:
+            del index[dep]
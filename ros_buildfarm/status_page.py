@@ -1,18 +1,20 @@
+from array import array
 from collections import namedtuple
-from distutils.version import LooseVersion
 import os
 import re
 import shutil
-import sys
 import time
 
 from .common import get_debian_package_name
 from .common import get_release_view_name
 from .common import get_short_arch
 from .common import Target
+from .config import get_distribution_cache
 from .config import get_index as get_config_index
 from .config import get_release_build_files
-from .debian_repo import get_debian_repo_data
+from .config import get_rosdistro_index
+from .debian_repo import get_debian_repos_data
+from .debian_version import get_debian_version_key
 from .status_page_input import get_rosdistro_info
 from .status_page_input import RosPackage
 from .templates import expand_template
@@ -23,7 +25,6 @@ def build_release_status_page(
         config_url, rosdistro_name, release_build_name,
         cache_dir, output_dir, copy_resources=False):
     from rosdistro import get_cached_distribution
-    from rosdistro import get_index
 
     start_time = time.localtime()
 
@@ -31,7 +32,7 @@ def build_release_status_page(
     release_build_files = get_release_build_files(config, rosdistro_name)
     build_file = release_build_files[release_build_name]
 
-    index = get_index(config.rosdistro_index_url)
+    index = get_rosdistro_index(config.rosdistro_index_url)
 
     # get targets
     targets = []
@@ -47,7 +48,9 @@ def build_release_status_page(
         print('  - %s %s' % (os_code_name, arch))
 
     # get all input data
-    dist = get_cached_distribution(index, rosdistro_name)
+    dist = get_cached_distribution(
+        index, rosdistro_name,
+        cache=get_distribution_cache(index, rosdistro_name))
 
     rosdistro_info = get_rosdistro_info(dist, build_file)
 
@@ -57,32 +60,19 @@ def build_release_status_page(
     testing_repo_url = os.path.join(base_url, 'testing')
     main_repo_url = os.path.join(base_url, 'main')
 
-    building_repo_data = get_debian_repo_data(
-        building_repo_url, targets, cache_dir)
-    testing_repo_data = get_debian_repo_data(
-        testing_repo_url, targets, cache_dir)
-    main_repo_data = get_debian_repo_data(main_repo_url, targets, cache_dir)
-
-    repos_data = [building_repo_data, testing_repo_data, main_repo_data]
+    repos_data = get_debian_repos_data(
+        [building_repo_url, testing_repo_url, main_repo_url], targets,
+        cache_dir)
+    building_repo_data, testing_repo_data, main_repo_data = repos_data
 
     # compute derived attributes
     package_descriptors = get_rosdistro_package_descriptors(
         rosdistro_info, rosdistro_name)
 
-    affected_by_sync = get_affected_by_sync(
-        package_descriptors, targets, testing_repo_data, main_repo_data)
-
-    regressions = get_regressions(
-        package_descriptors, targets,
-        building_repo_data, testing_repo_data, main_repo_data)
-
-    version_status = get_version_status(
-        package_descriptors, targets, repos_data, strip_version=True)
-
-    homogeneous = get_homogeneous(package_descriptors, targets, repos_data)
-
-    package_counts = get_package_counts(
-        package_descriptors, targets, repos_data)
+    views = get_status_views(
+        package_descriptors, targets, repos_data, strip_version=True,
+        sync_repos_data=[testing_repo_data, main_repo_data],
+        regression_repos_data=repos_data)
 
     jenkins_job_urls = get_jenkins_job_urls(
         rosdistro_name, config.jenkins_url, release_build_name, targets)
@@ -115,12 +105,12 @@ def build_release_status_page(
             [(t.arch, get_short_arch(t.arch)) for t in targets]),
         'repos_data': repos_data,
 
-        'affected_by_sync': affected_by_sync,
-        'homogeneous': homogeneous,
+        'affected_by_sync': views.affected_by_sync,
+        'homogeneous': views.homogeneous,
         'jenkins_job_urls': jenkins_job_urls,
-        'package_counts': package_counts,
-        'regressions': regressions,
-        'version_status': version_status,
+        'package_counts': views.package_counts,
+        'regressions': views.regressions,
+        'version_status': views.version_status,
     }
     html = expand_template(template_name, data)
     output_filename = os.path.join(
@@ -147,22 +137,14 @@ def build_debian_repos_status_page(
         targets.append(Target('ubuntu', os_code_name, arch))
 
     # get all input data
-    repos_data = []
-    for repo_url in repo_urls:
-        repo_data = get_debian_repo_data(repo_url, targets, cache_dir)
-        repos_data.append(repo_data)
+    repos_data = get_debian_repos_data(repo_urls, targets, cache_dir)
 
     # compute derived attributes
     package_descriptors = get_repos_package_descriptors(repos_data, targets)
 
-    version_status = get_version_status(
+    views = get_status_views(
         package_descriptors, targets, repos_data, strip_os_code_name=True)
 
-    homogeneous = get_homogeneous(package_descriptors, targets, repos_data)
-
-    package_counts = get_package_counts(
-        package_descriptors, targets, repos_data)
-
     # generate output
     repo_names = get_url_names(repo_urls)
 
@@ -203,11 +185,11 @@ def build_debian_repos_status_page(
         'repos_data': repos_data,
 
         'affected_by_sync': None,
-        'homogeneous': homogeneous,
+        'homogeneous': views.homogeneous,
         'jenkins_job_urls': None,
-        'package_counts': package_counts,
+        'package_counts': views.package_counts,
         'regressions': None,
-        'version_status': version_status,
+        'version_status': views.version_status,
     }
     html = expand_template(template_name, data)
     output_filename = os.path.join(
@@ -223,6 +205,78 @@ PackageDescriptor = namedtuple(
     'PackageDescriptor', 'pkg_name debian_pkg_name version')
 
 
+class VersionMatrix(object):
+    """
+    The versions of all packages for all targets and repositories.
+
+    Every distinct version string is interned as an integer id.
+    The version ids of each package are stored in a flat array indexed by
+    ``target_index * len(repos_data) + repo_index``.
+    Derived values like stripped versions and version comparisons are
+    computed only once per distinct version (pair).
+    """
+
+    def __init__(self, package_descriptors, targets, repos_data):
+        self.targets = list(targets)
+        self.repos_data = list(repos_data)
+        self.versions = [None]
+        self._version_ids = {None: 0}
+        self._stripped_ids = {}
+        self._os_code_name_stripped_ids = {}
+        self._gt_cache = {}
+
+        indexes = [
+            repo_data.get(target, {})
+            for target in self.targets for repo_data in self.repos_data]
+        self.rows = {}
+        for pkg_name, package_descriptor in package_descriptors.items():
+            debian_pkg_name = package_descriptor.debian_pkg_name
+            self.rows[pkg_name] = array('i', [
+                self.get_id(index.get(debian_pkg_name))
+                for index in indexes])
+
+    def get_id(self, version):
+        try:
+            return self._version_ids[version]
+        except KeyError:
+            version_id = len(self.versions)
+            self.versions.append(version)
+            self._version_ids[version] = version_id
+            return version_id
+
+    def get_target_offset(self, target):
+        return self.targets.index(target) * len(self.repos_data)
+
+    def strip_version_suffix(self, version_id):
+        try:
+            return self._stripped_ids[version_id]
+        except KeyError:
+            stripped_id = self.get_id(
+                _strip_version_suffix(self.versions[version_id]))
+            self._stripped_ids[version_id] = stripped_id
+            return stripped_id
+
+    def strip_os_code_name_suffix(self, version_id, os_code_name):
+        key = (version_id, os_code_name)
+        try:
+            return self._os_code_name_stripped_ids[key]
+        except KeyError:
+            stripped_id = self.get_id(_strip_os_code_name_suffix(
+                self.versions[version_id], os_code_name))
+            self._os_code_name_stripped_ids[key] = stripped_id
+            return stripped_id
+
+    def is_gt(self, version_id, other_version_id):
+        key = (version_id, other_version_id)
+        try:
+            return self._gt_cache[key]
+        except KeyError:
+            result = _version_is_gt_other(
+                self.versions[version_id], self.versions[other_version_id])
+            self._gt_cache[key] = result
+            return result
+
+
 def get_rosdistro_package_descriptors(rosdistro_info, rosdistro_name):
     descriptors = {}
     for pkg_name, pkg in rosdistro_info.items():
@@ -267,6 +321,133 @@ def get_url_names(urls):
     return names
 
 
+StatusViews = namedtuple(
+    'StatusViews',
+    'affected_by_sync regressions version_status homogeneous package_counts')
+
+
+def get_status_views(
+        package_descriptors, targets, repos_data,
+        strip_version=False, strip_os_code_name=False,
+        sync_repos_data=None, regression_repos_data=None, views=None):
+    """
+    Compute the views of the status page in a single pass over the matrix.
+
+    See L{get_affected_by_sync}, L{get_regressions}, L{get_version_status},
+    L{get_homogeneous} and L{get_package_counts} for the individual views.
+
+    :param sync_repos_data: the testing and main repository data which must
+      be part of C{repos_data}, if `None` C{affected_by_sync} is `None`
+    :param regression_repos_data: the building, testing and main repository
+      data which must be part of C{repos_data}, if `None` C{regressions} is
+      `None`
+    :param views: the names of the views to compute, `None` for all of them,
+      the views which are not computed are `None`
+    :return: a L{StatusViews} tuple
+    """
+    if views is None:
+        views = StatusViews._fields
+    matrix = VersionMatrix(package_descriptors, targets, repos_data)
+    target_offsets = [matrix.get_target_offset(t) for t in targets]
+    versions = matrix.versions
+    strip = matrix.strip_version_suffix
+    # map the repository data to the position in repos_data
+    positions = dict(
+        (id(repo_data), i) for i, repo_data in enumerate(repos_data))
+    sync_positions = None
+    if sync_repos_data is not None and 'affected_by_sync' in views:
+        sync_positions = [positions[id(r)] for r in sync_repos_data]
+    regression_positions = None
+    if regression_repos_data is not None and 'regressions' in views:
+        regression_positions = [
+            positions[id(r)] for r in regression_repos_data]
+    # the status only depends on the pair of versions
+    status_cache = {}
+
+    affected_by_sync = {} if sync_positions is not None else None
+    regressions = {} if regression_positions is not None else None
+    version_status = {} if 'version_status' in views else None
+    homogeneous = {} if 'homogeneous' in views else None
+    package_counts = None
+    if 'package_counts' in views:
+        package_counts = dict(
+            (target, [0] * len(repos_data)) for target in targets)
+    need_stripped_ids = strip_version or homogeneous is not None or \
+        affected_by_sync is not None
+    for pkg_name, package_descriptor in package_descriptors.items():
+        row = matrix.rows[pkg_name]
+        if version_status is not None:
+            ref_id = matrix.get_id(package_descriptor.version)
+            if strip_version:
+                ref_id = strip(ref_id)
+            version_status[pkg_name] = {}
+        if affected_by_sync is not None:
+            affected_by_sync[pkg_name] = {}
+        if regressions is not None:
+            regressions[pkg_name] = {}
+        # the stripped version of each repository for the first target
+        homogeneous_ids = None
+        is_homogeneous = True
+        for target, offset in zip(targets, target_offsets):
+            version_ids = list(row[offset:offset + len(repos_data)])
+            if need_stripped_ids:
+                stripped_ids = [strip(v) for v in version_ids]
+
+            if package_counts is not None:
+                counts = package_counts[target]
+                for i, version_id in enumerate(version_ids):
+                    if versions[version_id]:
+                        counts[i] += 1
+
+            if version_status is not None:
+                statuses = []
+                status_ids = stripped_ids if strip_version else version_ids
+                for status_id in status_ids:
+                    if strip_os_code_name:
+                        status_id = matrix.strip_os_code_name_suffix(
+                            status_id, target.os_code_name)
+                    key = (ref_id, status_id)
+                    try:
+                        statuses.append(status_cache[key])
+                    except KeyError:
+                        status = _get_version_status(
+                            matrix, ref_id, status_id)
+                        status_cache[key] = status
+                        statuses.append(status)
+                version_status[pkg_name][target] = statuses
+
+            if homogeneous is not None and is_homogeneous:
+                if homogeneous_ids is None:
+                    homogeneous_ids = stripped_ids
+                elif stripped_ids != homogeneous_ids:
+                    is_homogeneous = False
+
+            if affected_by_sync is not None:
+                testing_position, main_position = sync_positions
+                affected_by_sync[pkg_name][target] = \
+                    stripped_ids[testing_position] != \
+                    stripped_ids[main_position]
+
+            if regressions is not None:
+                regressions[pkg_name][target] = False
+                main_id = version_ids[regression_positions[-1]]
+                if versions[main_id] is not None:
+                    for position in regression_positions[:-1]:
+                        version_id = version_ids[position]
+                        if not versions[version_id] or \
+                                matrix.is_gt(main_id, version_id):
+                            regressions[pkg_name][target] = True
+
+        if homogeneous is not None:
+            # without targets there is no version to be homogeneous
+            homogeneous[pkg_name] = is_homogeneous and \
+                (homogeneous_ids is not None or not repos_data)
+
+    return StatusViews(
+        affected_by_sync, regressions, version_status, homogeneous,
+        package_counts)
+
+
 def get_affected_by_sync(
         package_descriptors, targets,
         testing_repo_data, main_repo_data):
@@ -279,21 +460,11 @@ def get_affected_by_sync(
     :return: a dict indexed by package names containing
       dicts indexed by targets containing a boolean flag
     """
-    affected_by_sync = {}
-    for package_descriptor in package_descriptors.values():
-        pkg_name = package_descriptor.pkg_name
-        debian_pkg_name = package_descriptor.debian_pkg_name
-
-        affected_by_sync[pkg_name] = {}
-        for target in targets:
-            testing_version = _strip_version_suffix(
-                testing_repo_data.get(target, {}).get(debian_pkg_name, None))
-            main_version = _strip_version_suffix(
-                main_repo_data.get(target, {}).get(debian_pkg_name, None))
-
-            affected_by_sync[pkg_name][target] = \
-                testing_version != main_version
-    return affected_by_sync
+    repos_data = [testing_repo_data, main_repo_data]
+    return get_status_views(
+        package_descriptors, targets, repos_data,
+        sync_repos_data=repos_data,
+        views=['affected_by_sync']).affected_by_sync
 
 
 def get_regressions(
@@ -309,24 +480,10 @@ def get_regressions(
     :return: a dict indexed by package names containing
       dicts indexed by targets containing a boolean flag
     """
-    regressions = {}
-    for package_descriptor in package_descriptors.values():
-        pkg_name = package_descriptor.pkg_name
-        debian_pkg_name = package_descriptor.debian_pkg_name
-
-        regressions[pkg_name] = {}
-        for target in targets:
-            regressions[pkg_name][target] = False
-            main_version = \
-                main_repo_data.get(target, {}).get(debian_pkg_name, None)
-            if main_version is not None:
-                main_ver_loose = LooseVersion(main_version)
-                for repo_data in [building_repo_data, testing_repo_data]:
-                    version = \
-                        repo_data.get(target, {}).get(debian_pkg_name, None)
-                    if not version or main_ver_loose > LooseVersion(version):
-                        regressions[pkg_name][target] = True
-    return regressions
+    repos_data = [building_repo_data, testing_repo_data, main_repo_data]
+    return get_status_views(
+        package_descriptors, targets, repos_data,
+        regression_repos_data=repos_data, views=['regressions']).regressions
 
 
 def get_version_status(
@@ -342,42 +499,26 @@ def get_version_status(
       dicts indexed by targets containing
       a list of status strings (one for each repo)
     """
-    status = {}
-    for package_descriptor in package_descriptors.values():
-        pkg_name = package_descriptor.pkg_name
-        debian_pkg_name = package_descriptor.debian_pkg_name
-        ref_version = package_descriptor.version
-        if strip_version:
-            ref_version = _strip_version_suffix(ref_version)
-
-        status[pkg_name] = {}
-        for target in targets:
-            statuses = []
-            for repo_data in repos_data:
-                version = repo_data.get(target, {}).get(debian_pkg_name, None)
-                if strip_version:
-                    version = _strip_version_suffix(version)
-                if strip_os_code_name:
-                    version = _strip_os_code_name_suffix(
-                        version, target.os_code_name)
-
-                if ref_version:
-                    if not version:
-                        statuses.append('missing')
-                    elif version.startswith(ref_version):  # including equal
-                        statuses.append('equal')
-                    else:
-                        if _version_is_gt_other(version, ref_version):
-                            statuses.append('higher')
-                        else:
-                            statuses.append('lower')
-                else:
-                    if not version:
-                        statuses.append('ignore')
-                    else:
-                        statuses.append('obsolete')
-            status[pkg_name][target] = statuses
-    return status
+    return get_status_views(
+        package_descriptors, targets, repos_data,
+        strip_version=strip_version, strip_os_code_name=strip_os_code_name,
+        views=['version_status']).version_status
+
+
+def _get_version_status(matrix, ref_id, version_id):
+    ref_version = matrix.versions[ref_id]
+    version = matrix.versions[version_id]
+    if ref_version:
+        if not version:
+            return 'missing'
+        if version.startswith(ref_version):  # including equal
+            return 'equal'
+        if matrix.is_gt(version_id, ref_id):
+            return 'higher'
+        return 'lower'
+    if not version:
+        return 'ignore'
+    return 'obsolete'
 
 
 version_regex = re.compile(r'[0-9.-]+[0-9]')
@@ -419,41 +560,22 @@ def get_homogeneous(package_descriptors, targets, repos_data):
 
     :return: a dict indexed by package names containing a boolean flag
     """
-    homogeneous = {}
-    for package_descriptor in package_descriptors.values():
-        pkg_name = package_descriptor.pkg_name
-        debian_pkg_name = package_descriptor.debian_pkg_name
-
-        versions = []
-        for repo_data in repos_data:
-            versions.append(set([]))
-            for target in targets:
-                version = _strip_version_suffix(
-                    repo_data.get(target, {}).get(debian_pkg_name, None))
-                versions[-1].add(version)
-        homogeneous[pkg_name] = max([len(v) for v in versions]) == 1
-    return homogeneous
+    return get_status_views(
+        package_descriptors, targets, repos_data,
+        views=['homogeneous']).homogeneous
 
 
-def get_package_counts(package_descriptors, targets, repos_data):
+def get_package_counts(
+        package_descriptors, targets, repos_data):
     """
     Get the number of packages per target and repository.
 
     :return: a dict indexed by targets containing
       a list of integer values (one for each repo)
     """
-    counts = {}
-    for target in targets:
-        counts[target] = [0] * len(repos_data)
-    for package_descriptor in package_descriptors.values():
-        debian_pkg_name = package_descriptor.debian_pkg_name
-
-        for target in targets:
-            for i, repo_data in enumerate(repos_data):
-                version = repo_data.get(target, {}).get(debian_pkg_name, None)
-                if version:
-                    counts[target][i] += 1
-    return counts
+    return get_status_views(
+        package_descriptors, targets, repos_data,
+        views=['package_counts']).package_counts
 
 
 def get_jenkins_job_urls(
@@ -504,26 +626,5 @@ def get_resource_hashes():
 
 
 def _version_is_gt_other(version, other_version):
-    try:
-        # might raise TypeError: http://bugs.python.org/issue14894
-        return LooseVersion(version) > LooseVersion(other_version)
-    except TypeError:
-        loose_version, other_loose_version = \
-            _get_comparable_loose_versions(version, other_version)
-        return loose_version < other_loose_version
-
-
-def _get_comparable_loose_versions(version_str1, version_str2):
-    loose_version1 = LooseVersion(version_str1)
-    loose_version2 = LooseVersion(version_str2)
-    if sys.version_info[0] > 2:
-        # might raise TypeError in Python 3: http://bugs.python.org/issue14894
-        version_parts1 = loose_version1.version
-        version_parts2 = loose_version2.version
-        for i in range(min(len(version_parts1), len(version_parts2))):
-            try:
-                version_parts1[i] < version_parts2[i]
-            except TypeError:
-                version_parts1[i] = str(version_parts1[i])
-                version_parts2[i] = str(version_parts2[i])
-    return loose_version1, loose_version2
+    return get_debian_version_key(version) > \
+        get_debian_version_key(other_version)
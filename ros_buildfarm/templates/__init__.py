@@ -1,6 +1,13 @@
 from __future__ import print_function
 
+import atexit
+from em import BANGPATH
+from em import BANGPATH_OPT
+from em import Context
+from em import DEFAULT_PREFIX
 from em import Interpreter
+from em import OVERRIDE_OPT
+from em import Scanner
 try:
     from cStringIO import StringIO
 except ImportError:
@@ -15,15 +22,39 @@ template_basepath = os.path.abspath(os.path.dirname(__file__))
 interpreter = None
 template_hooks = None
 
+# parsed tokens of templates indexed by the path, mtime and bangpath option
+_cached_tokens = {}
+# idle interpreters which can be reused for expanding further templates
+_interpreter_pool = []
+
+
+class CachingInterpreter(Interpreter):
+
+    """Interpreter caching the compiled code of evaluated expressions."""
+
+    _compiled_expressions = {}
+
+    def evaluate(self, expression, locals=None):
+        code = self._compiled_expressions.get(expression)
+        if code is None:
+            # eval() strips leading and trailing spaces and tabs
+            code = compile(expression.strip(' \t'), '<string>', 'eval')
+            self._compiled_expressions[expression] = code
+        return super(CachingInterpreter, self).evaluate(code, locals=locals)
+
 
 def expand_template(template_name, data, options=None):
     global template_basepath
     global interpreter
     global template_hooks
 
+    # hooks might rely on the interpreter reading the actual files
+    use_cache = not template_hooks
+
     output = StringIO()
+    outer_interpreter = interpreter
+    interpreter = _get_interpreter(output, options, use_cache)
     try:
-        interpreter = Interpreter(output=output, options=options)
         for template_hook in template_hooks or []:
             interpreter.addHook(template_hook)
         template_path = os.path.join(template_basepath, template_name)
@@ -43,16 +74,86 @@ def expand_template(template_name, data, options=None):
 
         _add_helper_functions(data)
 
-        interpreter.file(open(template_path, 'r'), locals=data)
+        if use_cache:
+            _run_template(interpreter, template_path, template_name, data)
+        else:
+            interpreter.file(open(template_path, 'r'), locals=data)
         value = output.getvalue()
+        if use_cache:
+            _interpreter_pool.append((options, interpreter))
+        else:
+            interpreter.shutdown()
         return value
     except Exception as e:
         print("%s processing template '%s'" %
               (e.__class__.__name__, template_name), file=sys.stderr)
+        interpreter.shutdown()
         raise
     finally:
-        interpreter.shutdown()
-        interpreter = None
+        interpreter = outer_interpreter
+
+
+@atexit.register
+def _shutdown_interpreter_pool():
+    while _interpreter_pool:
+        _, pooled_interpreter = _interpreter_pool.pop()
+        pooled_interpreter.shutdown()
+
+
+def _get_interpreter(output, options, use_cache):
+    # don't redirect the process-wide sys.stdout into the template output
+    # since other threads (e.g. configuring jobs) print while expanding
+    interpreter_options = {OVERRIDE_OPT: False}
+    interpreter_options.update(options or {})
+    if use_cache:
+        # reuse an idle interpreter created with the same options
+        for i, (pooled_options, pooled_interpreter) in enumerate(
+                _interpreter_pool):
+            if pooled_options == options:
+                del _interpreter_pool[i]
+                pooled_interpreter.output = output
+                pooled_interpreter.clear()
+                pooled_interpreter.reset()
+                return pooled_interpreter
+        return CachingInterpreter(
+            output=output, options=interpreter_options)
+    return Interpreter(output=output, options=interpreter_options)
+
+
+def _get_template_tokens(template_path, bangpath):
+    """Get the parsed tokens of a template, cached until it is modified."""
+    key = (template_path, os.path.getmtime(template_path), bangpath)
+    tokens = _cached_tokens.get(key)
+    if tokens is None:
+        with open(template_path, 'r') as h:
+            content = h.read()
+        prefix = DEFAULT_PREFIX
+        # same as the interpreter does when reading a file
+        if bangpath and content.startswith(BANGPATH):
+            content = prefix + '#' + content[2:]
+        # terminate the last line same as the interpreter does
+        if content and content[-1] != '\n':
+            content += prefix + '\n'
+        scanner = Scanner(prefix, content)
+        tokens = []
+        while True:
+            token = scanner.one()
+            if token is None:
+                break
+            tokens.append(token)
+        _cached_tokens[key] = tokens
+    return tokens
+
+
+def _run_template(interpreter, template_path, template_name, locals_):
+    bangpath = interpreter.options.get(BANGPATH_OPT, True)
+    tokens = _get_template_tokens(template_path, bangpath)
+    interpreter.contexts.push(Context(template_name))
+    try:
+        for token in tokens:
+            token.run(interpreter, locals_)
+    finally:
+        interpreter.contexts.pop()
 
 
 def _add_helper_functions(data):
@@ -81,14 +182,17 @@ def _expand_template(template_name, **kwargs):
     global interpreter
     template_path = os.path.join(template_basepath, template_name)
     _add_helper_functions(kwargs)
-    with open(template_path, 'r') as h:
-        try:
-            interpreter.include(h, kwargs)
-        except Exception as e:
-            print(
-                "%s in template '%s': %s" %
-                (e.__class__.__name__, template_name, str(e)), file=sys.stderr)
-            sys.exit(1)
+    try:
+        if not template_hooks:
+            _run_template(interpreter, template_path, template_name, kwargs)
+        else:
+            with open(template_path, 'r') as h:
+                interpreter.include(h, kwargs)
+    except Exception as e:
+        print(
+            "%s in template '%s': %s" %
+            (e.__class__.__name__, template_name, str(e)), file=sys.stderr)
+        sys.exit(1)
 
 
 def create_dockerfile(template_name, data, dockerfile_dir):
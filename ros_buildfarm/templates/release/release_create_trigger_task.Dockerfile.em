@@ -48,5 +48,7 @@ if missing_only:
     cmd += ' --missing-only'
 if source_only:
     cmd += ' --source-only'
+if dependency_order:
+    cmd += ' --dependency-order'
 }@
 CMD ["@(cmd.replace('"', '\\"'))"]
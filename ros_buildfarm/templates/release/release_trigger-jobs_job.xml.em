@@ -97,7 +97,6 @@
         'echo "# END SECTION"',
         '',
         'echo "# BEGIN SECTION: Run Dockerfile - reconfigure jobs"',
-        'rm -fr $WORKSPACE/debian_repo_cache',
         'mkdir -p $WORKSPACE/debian_repo_cache',
         'docker run' +
         ' --cidfile=$WORKSPACE/docker_trigger_jobs/docker.cid' +
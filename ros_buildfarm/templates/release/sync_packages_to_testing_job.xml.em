@@ -71,7 +71,6 @@
         'echo "# END SECTION"',
         '',
         'echo "# BEGIN SECTION: Run Dockerfile - check sync condition"',
-        'rm -fr $WORKSPACE/debian_repo_cache',
         'mkdir -p $WORKSPACE/debian_repo_cache',
         'docker run' +
         ' --cidfile=$WORKSPACE/docker_check_sync_criteria/docker.cid' +
@@ -3,7 +3,6 @@ import jenkins.model.Jenkins
 
 job_names = []
 @{
-job_names = sorted(job_names)
 group_size = 1000
 }@
 // group job names in chunks of @group_size to not exceed groovy limits
@@ -0,0 +1,10 @@
+import java.security.MessageDigest
+import jenkins.model.Jenkins
+
+// print the name and the MD5 hash of the config of every job
+// one line per job, separated by a tab
+for (p in Jenkins.instance.items) {
+    config_bytes = p.getConfigFile().getFile().bytes
+    digest = MessageDigest.getInstance('MD5').digest(config_bytes)
+    println p.name + '\t' + digest.encodeHex().toString()
+}
@@ -1,6 +1,8 @@
 import difflib.DiffUtils
+import java.io.ByteArrayInputStream
 import java.io.StringBufferInputStream
 import java.io.StringWriter
+import java.util.zip.GZIPInputStream
 import javax.xml.parsers.DocumentBuilderFactory
 import javax.xml.transform.stream.StreamSource
 import jenkins.model.Jenkins
@@ -13,7 +15,7 @@ job_prefixes_and_names = [:]
 @[for job_type in sorted(job_prefixes_and_names.keys())]@
 job_prefixes_and_names['@job_type'] = [
     'job_prefix': '@(job_prefixes_and_names[job_type][0])',
-    'job_names': [],
+    'job_names': [] as Set,
 ]
 @{
 job_names = sorted(job_prefixes_and_names[job_type][1])
@@ -30,23 +32,21 @@ add_job_prefixes_and_names_@(job_type)_@(int(i / group_size) + 1)(job_prefixes_a
 @[end for]@
 @[end for]@
 
-// job configurations
-job_configs = [:]
-@{
-job_config_keys = sorted(job_configs.keys())
-group_size = 1000
-}@
-// group job configs in chunks of @group_size to not exceed groovy limits
-@[for i in range(0, len(job_config_keys), group_size)]@
-def add_job_config_@(int(i / group_size) + 1)(job_configs) {
-@[for j in range(i, min(i + group_size, len(job_config_keys)))]@
-job_configs['@job_config_keys[j]'] = '''@(job_configs[job_config_keys[j]].replace('\\', '\\\\'))'''
-
+// job configurations as chunks of a base64 encoded gzip stream
+// containing the null-separated job names and configs
+job_config_chunks = []
+@[for chunk in job_configs.get_chunks()]@
+job_config_chunks << '@chunk'
 @[end for]@
-}
-add_job_config_@(int(i / group_size) + 1)(job_configs)
 
-@[end for]@
+job_configs = [:]
+job_config_fields = new GZIPInputStream(new ByteArrayInputStream(
+    job_config_chunks.join('').decodeBase64())).getText('UTF-8').split('\u0000')
+for (i = 0; i + 1 < job_config_fields.size(); i += 2) {
+    job_configs[job_config_fields[i]] = job_config_fields[i + 1]
+}
+job_config_chunks = null
+job_config_fields = null
 
 
 
@@ -100,19 +100,32 @@ def format_xml(doc) {
 }
 
 
+def get_duration(start_time) {
+    return String.format('%.1fs', (System.currentTimeMillis() - start_time) / 1000.0)
+}
+
+
 // reconfigure jobs
 println '# BEGIN SECTION: Groovy script - reconfigure jobs'
 println 'Reconfiguring ' + job_configs.size() + ' jobs...'
+start_time = System.currentTimeMillis()
+// index the existing items by name once instead of searching all of them
+// for every job
+items_by_name = [:]
+for (p in Jenkins.instance.allItems) {
+    if (!items_by_name.containsKey(p.name)) {
+        items_by_name[p.name] = p
+    }
+}
+println 'Indexed ' + items_by_name.size() + ' existing jobs in ' + get_duration(start_time)
 created = 0
 updated = 0
 skipped = 0
 for (item in job_configs) {
-    found_project = false
     job_name = item.key
     job_config = item.value
-    for (p in Jenkins.instance.allItems) {
-        if (p.name != job_name) continue
-        found_project = true
+    p = items_by_name[job_name]
+    if (p != null) {
         job_config_file = p.getConfigFile()
 
         diff = diff_configs(job_config_file, job_config)
@@ -132,9 +145,7 @@ for (item in job_configs) {
             p.updateByXml(source)
             updated += 1
         }
-        break
-    }
-    if (!found_project) {
+    } else {
         println "Creating job '" + job_name + "'"
         stream = new StringBufferInputStream(job_config)
         Jenkins.instance.createProjectFromXML(job_name, stream)
@@ -142,6 +153,7 @@ for (item in job_configs) {
     }
 }
 println 'Created ' + created + ' jobs, updated ' + updated + ' jobs, skipped ' + skipped + ' jobs.'
+println 'Reconfiguring jobs took ' + get_duration(start_time)
 println '# END SECTION'
 
 // delete obsolete jobs
@@ -152,6 +164,7 @@ for (item in job_prefixes_and_names) {
     deleted = 0
     println "# BEGIN SECTION: Groovy script - delete obsolete '" + job_type + "' jobs"
     println "Searching for obsolete jobs starting with '" + job_prefix + "'"
+    start_time = System.currentTimeMillis()
     for (p in Jenkins.instance.allItems) {
         if (!p.name.startsWith(job_prefix)) continue
         if (p.name in job_names) continue
@@ -159,6 +172,6 @@ for (item in job_prefixes_and_names) {
         p.delete()
         deleted += 1
     }
-    println 'Deleted ' + deleted + ' jobs.'
+    println 'Deleted ' + deleted + ' jobs in ' + get_duration(start_time)
     println '# END SECTION'
 }
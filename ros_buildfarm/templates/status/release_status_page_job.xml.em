@@ -77,7 +77,6 @@
         'echo "# END SECTION"',
         '',
         'echo "# BEGIN SECTION: Run Dockerfile - status page"',
-        'rm -fr $WORKSPACE/debian_repo_cache',
         'rm -fr $WORKSPACE/status_page',
         'mkdir -p $WORKSPACE/debian_repo_cache',
         'mkdir -p $WORKSPACE/status_page',
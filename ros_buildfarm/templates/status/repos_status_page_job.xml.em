@@ -42,7 +42,6 @@
 @(SNIPPET(
     'builder_shell',
     script='\n'.join([
-        'rm -fr $WORKSPACE/debian_repo_cache',
         'rm -fr $WORKSPACE/status_page',
         'mkdir -p $WORKSPACE/debian_repo_cache',
         'mkdir -p $WORKSPACE/status_page',
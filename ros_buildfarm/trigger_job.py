@@ -1,28 +1,49 @@
-from rosdistro import get_index
-
 from ros_buildfarm.jenkins import connect
-from ros_buildfarm.jenkins import invoke_job
+from ros_buildfarm.jenkins import JobTrigger
 
 from .common import get_binarydeb_job_name
 from .common import get_debian_package_name
 from .common import get_sourcedeb_job_name
 from .common import Target
 from ros_buildfarm.config import get_distribution_file
+from .config import get_distribution_cache
 from .config import get_index as get_config_index
 from .config import get_release_build_files
+from .config import get_rosdistro_index
 from .debian_repo import get_debian_repo_data
+from .debian_version import compare_debian_versions
+from .dependency_graph import get_release_dependency_graph
+from .release_job import get_import_package_job_name
 from .status_page import _strip_version_suffix
 from .templates import expand_template
 
 
 def trigger_release_jobs(
         config_url, rosdistro_name, release_build_name,
-        missing_only, source_only, cache_dir, cause=None, groovy_script=None):
+        missing_only, source_only, cache_dir, cause=None, groovy_script=None,
+        dependency_order=False, wait_for_waves=False):
+    """
+    Trigger the release jobs of all packages.
+
+    With `dependency_order` the packages are grouped into waves based on the
+    dependency graph and the jobs of each wave are triggered after the jobs
+    of the previous waves.
+    With `wait_for_waves` the jobs of each wave additionally need to finish
+    before the next wave is triggered, which is not possible when only
+    generating a groovy script.
+    This includes the import of the built packages into the building
+    repository which is triggered by the binary jobs.
+    """
+    if wait_for_waves and groovy_script is not None:
+        raise RuntimeError(
+            'Waiting for waves is not possible when generating a groovy '
+            'script')
+    dependency_order = dependency_order or wait_for_waves
     config = get_config_index(config_url)
     build_files = get_release_build_files(config, rosdistro_name)
     build_file = build_files[release_build_name]
 
-    index = get_index(config.rosdistro_index_url)
+    index = get_rosdistro_index(config.rosdistro_index_url)
 
     # get targets
     targets = []
@@ -48,15 +69,78 @@ def trigger_release_jobs(
         repo_data = get_debian_repo_data(
             build_file.target_repository, targets, cache_dir)
 
+    job_trigger = None
     if groovy_script is None:
-        jenkins = connect(config.jenkins_url)
-
-    pkg_names = dist_file.release_packages.keys()
-    pkg_names = build_file.filter_packages(pkg_names)
+        job_trigger = JobTrigger(connect(config.jenkins_url))
+
+    all_pkg_names = dist_file.release_packages.keys()
+    pkg_names = set(build_file.filter_packages(all_pkg_names))
+    explicitly_ignored_pkg_names = set(all_pkg_names) - pkg_names
+    dependency_graph = None
+    if explicitly_ignored_pkg_names or dependency_order:
+        dist_cache = get_distribution_cache(index, rosdistro_name)
+        dependency_graph = get_release_dependency_graph(
+            dist_cache, all_pkg_names)
+    if explicitly_ignored_pkg_names:
+        # the jobs of packages depending on ignored packages are not being
+        # generated or disabled, therefore they can't be triggered
+        pkg_names -= \
+            dependency_graph.get_recursive_dependents(
+                explicitly_ignored_pkg_names)
+
+    if dependency_order:
+        waves = [
+            [n for n in level if n in pkg_names]
+            for level in dependency_graph.get_levels()]
+        waves = [w for w in waves if w]
+        print('Triggering the jobs in %d waves ordered by dependencies' %
+              len(waves))
+    else:
+        waves = [sorted(pkg_names)]
 
     triggered_jobs = []
     skipped_jobs = []
-    for pkg_name in sorted(pkg_names):
+    for i, wave in enumerate(waves):
+        if dependency_order:
+            print('Wave %d of %d with %d packages' %
+                  (i + 1, len(waves), len(wave)))
+        wave_job_names = _trigger_package_jobs(
+            wave, rosdistro_name, release_build_name, dist_file, targets,
+            repo_data, cause, job_trigger, triggered_jobs, skipped_jobs)
+        if wait_for_waves and i + 1 < len(waves):
+            print('Waiting for the jobs of wave %d to finish' % (i + 1))
+            # the next wave needs the packages in the building repository
+            job_trigger.wait_for_jobs(
+                wave_job_names + [get_import_package_job_name(rosdistro_name)])
+
+    if job_trigger is not None:
+        job_trigger.shutdown()
+        print('Triggered %d jobs, skipped %d jobs.' %
+              (len(triggered_jobs), len(skipped_jobs)))
+    else:
+        print("Writing groovy script '%s' to trigger %d jobs" %
+              (groovy_script, len(triggered_jobs)))
+        data = {
+            'job_names': triggered_jobs if dependency_order
+            else sorted(triggered_jobs),
+        }
+        content = expand_template('release/trigger_jobs.groovy.em', data)
+        with open(groovy_script, 'w') as h:
+            h.write(content)
+
+
+def _trigger_package_jobs(
+        pkg_names, rosdistro_name, release_build_name, dist_file, targets,
+        repo_data, cause, job_trigger, triggered_jobs, skipped_jobs):
+    """
+    Trigger the jobs of a set of packages.
+
+    Without a job trigger the jobs are only added to the triggered jobs.
+
+    :returns: the names of all jobs of the packages
+    """
+    job_names = []
+    for pkg_name in pkg_names:
         pkg = dist_file.release_packages[pkg_name]
         repo_name = pkg.repository_name
         repo = dist_file.repositories[repo_name]
@@ -72,19 +156,24 @@ def trigger_release_jobs(
 
         debian_package_name = get_debian_package_name(rosdistro_name, pkg_name)
 
+        triggered_source_job_names = set([])
         for target in targets:
             job_name = get_sourcedeb_job_name(
                 rosdistro_name, release_build_name,
                 pkg_name, target.os_name, target.os_code_name)
             if target.arch != 'source':
-                # binary job can be skipped if source job was triggered
-                if job_name in triggered_jobs:
-                    print(("  Skipping binary jobs of '%s' since the source " +
-                           "job was triggered") % job_name)
-                    continue
+                source_job_name = job_name
                 job_name = get_binarydeb_job_name(
                     rosdistro_name, release_build_name,
                     pkg_name, target.os_name, target.os_code_name, target.arch)
+                job_names.append(job_name)
+                # binary job can be skipped if source job was triggered
+                if source_job_name in triggered_source_job_names:
+                    print(("  Skipping binary jobs of '%s' since the source " +
+                           "job was triggered") % source_job_name)
+                    continue
+            else:
+                job_names.append(job_name)
 
             if repo_data:
                 # check if artifact is missing
@@ -92,29 +181,20 @@ def trigger_release_jobs(
                 if debian_package_name in repo_index:
                     version = repo_index[debian_package_name]
                     version = _strip_version_suffix(version)
-                    if version == pkg_version:
+                    if version and \
+                            compare_debian_versions(version, pkg_version) == 0:
                         print(("  Skipping job '%s' since the artifact is " +
                                "already up-to-date") % job_name)
                         continue
 
-            if groovy_script is None:
-                success = invoke_job(jenkins, job_name, cause=cause)
+            if job_trigger is not None:
+                success = job_trigger.invoke_job(job_name, cause=cause)
             else:
                 success = True
             if success:
                 triggered_jobs.append(job_name)
+                if target.arch == 'source':
+                    triggered_source_job_names.add(job_name)
             else:
                 skipped_jobs.append(job_name)
-
-    if groovy_script is None:
-        print('Triggered %d jobs, skipped %d jobs.' %
-              (len(triggered_jobs), len(skipped_jobs)))
-    else:
-        print("Writing groovy script '%s' to trigger %d jobs" %
-              (groovy_script, len(triggered_jobs)))
-        data = {
-            'job_names': triggered_jobs,
-        }
-        content = expand_template('release/trigger_jobs.groovy.em', data)
-        with open(groovy_script, 'w') as h:
-            h.write(content)
+    return job_names
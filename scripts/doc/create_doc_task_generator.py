@@ -170,12 +170,14 @@ def main(argv=sys.argv[1:]):
 
     # update package deps and metapackage deps
     with Scope('SUBSECTION', 'updated rosdoc_index information'):
+        forward_deps = {}
+        metapackage_deps = {}
         for pkg in pkgs.values():
             print("Updating dependendencies for package '%s'" % pkg.name)
             depends = _get_build_run_doc_dependencies(pkg)
             ros_dependency_names = sorted(set([
                 d.name for d in depends if d.name in valid_package_names]))
-            rosdoc_index.set_forward_deps(pkg.name, ros_dependency_names)
+            forward_deps[pkg.name] = ros_dependency_names
 
             if pkg.is_metapackage():
                 print("Updating dependendencies for metapackage '%s'" %
@@ -185,8 +187,9 @@ def main(argv=sys.argv[1:]):
                     d.name for d in depends if d.name in valid_package_names]))
             else:
                 ros_dependency_names = None
-            rosdoc_index.set_metapackage_deps(
-                pkg.name, ros_dependency_names)
+            metapackage_deps[pkg.name] = ros_dependency_names
+        rosdoc_index.update_forward_deps(forward_deps)
+        rosdoc_index.update_metapackage_deps(metapackage_deps)
         rosdoc_index.write_modified_data(
             args.output_dir, ['deps', 'metapackage_deps'])
 
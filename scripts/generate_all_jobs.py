@@ -1,17 +1,31 @@
 #!/usr/bin/env python3
 
+from __future__ import print_function
+
 import argparse
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import importlib.util
 import os
+import shutil
 import subprocess
 import sys
-
+import tempfile
+import time
+import traceback
 
 from ros_buildfarm.argument import add_argument_config_url
 from ros_buildfarm.config import get_doc_build_files
 from ros_buildfarm.config import get_index
 from ros_buildfarm.config import get_release_build_files
 from ros_buildfarm.config import get_source_build_files
+from ros_buildfarm.config.loader import CACHE_DIR_ENVIRONMENT_VARIABLE
 from ros_buildfarm.jenkins import connect
+from ros_buildfarm.jenkins import share_connections
+
+DEFAULT_PARALLEL_TASKS = 4
 
 
 def main(argv=sys.argv[1:]):
@@ -24,8 +38,34 @@ def main(argv=sys.argv[1:]):
         metavar='ROS_DISTRO_NAME',
         default=[],
         help='The list of ROS distribution names if not generating all')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        '--parallel-tasks',
+        type=int,
+        default=DEFAULT_PARALLEL_TASKS,
+        help='The maximum number of generator scripts being invoked '
+             'concurrently (default: %d)' % DEFAULT_PARALLEL_TASKS)
+    group.add_argument(
+        '--in-process',
+        action='store_true',
+        help='Invoke the generator scripts sequentially within this process '
+             'sharing the Jenkins connection and the loaded configuration '
+             'instead of spawning a subprocess for each')
     args = parser.parse_args(argv)
 
+    # share fetched config files with all invoked scripts
+    cache_dir = None
+    if CACHE_DIR_ENVIRONMENT_VARIABLE not in os.environ:
+        cache_dir = tempfile.mkdtemp(prefix='ros_buildfarm_config_cache_')
+        os.environ[CACHE_DIR_ENVIRONMENT_VARIABLE] = cache_dir
+    try:
+        return _generate_all_jobs(parser, args)
+    finally:
+        if cache_dir is not None:
+            shutil.rmtree(cache_dir)
+
+
+def _generate_all_jobs(parser, args):
     config = get_index(args.config_url)
     ros_distro_names = config.distributions.keys()
 
@@ -36,59 +76,184 @@ def main(argv=sys.argv[1:]):
             'The following ROS distribution names are not part of the ' +
             'buildfarm index: ' + ', '.join(sorted(invalid_ros_distro_name)))
 
+    if args.in_process:
+        share_connections()
+
     # try to connect to Jenkins master
     connect(config.jenkins_url)
 
-    generate_dashboard_job(args.config_url)
-
     selected_ros_distro_names = [
         n for n in ros_distro_names
         if not args.ros_distro_names or n in args.ros_distro_names]
 
-    for ros_distro_name in sorted(selected_ros_distro_names):
-        print(ros_distro_name)
+    tasks = get_tasks(args.config_url, config, selected_ros_distro_names)
+    if args.in_process:
+        # the template expansion is not thread-safe
+        failed_task_names = run_tasks(
+            tasks, 1, run_task=_run_task_in_process)
+    else:
+        failed_task_names = run_tasks(tasks, args.parallel_tasks)
+    if failed_task_names:
+        print('The following tasks failed:', file=sys.stderr)
+        for name in failed_task_names:
+            print('  -', name, file=sys.stderr)
+        return 1
+
+
+Task = namedtuple('Task', 'name cmd dependencies')
+
 
-        generate_rosdistro_cache_job(args.config_url, ros_distro_name)
+def get_tasks(config_url, config, ros_distro_names):
+    """
+    Get the tasks to generate all jobs.
+
+    The dashboard job is generated first since it also creates the
+    management view which all other tasks would otherwise race to create.
+    """
+    dashboard_task = Task(
+        'dashboard', get_dashboard_job_cmd(config_url), [])
+    tasks = [dashboard_task]
+
+    def add_task(name, cmd):
+        tasks.append(Task(name, cmd, [dashboard_task.name]))
+
+    for ros_distro_name in sorted(ros_distro_names):
+        add_task(
+            '%s rosdistro-cache' % ros_distro_name,
+            get_rosdistro_cache_job_cmd(config_url, ros_distro_name))
 
         release_build_files = get_release_build_files(config, ros_distro_name)
-        for release_build_name in release_build_files.keys():
-            generate_release_status_page_job(
-                args.config_url, ros_distro_name, release_build_name)
-            generate_release_maintenance_jobs(
-                args.config_url, ros_distro_name, release_build_name)
+        for release_build_name in sorted(release_build_files.keys()):
+            add_task(
+                '%s %s release-status-page' %
+                (ros_distro_name, release_build_name),
+                get_release_status_page_job_cmd(
+                    config_url, ros_distro_name, release_build_name))
+            add_task(
+                '%s %s release-maintenance' %
+                (ros_distro_name, release_build_name),
+                get_release_maintenance_jobs_cmd(
+                    config_url, ros_distro_name, release_build_name))
 
         source_build_files = get_source_build_files(config, ros_distro_name)
-        for source_build_name in source_build_files.keys():
-            generate_devel_maintenance_jobs(
-                args.config_url, ros_distro_name, source_build_name)
+        for source_build_name in sorted(source_build_files.keys()):
+            add_task(
+                '%s %s devel-maintenance' %
+                (ros_distro_name, source_build_name),
+                get_devel_maintenance_jobs_cmd(
+                    config_url, ros_distro_name, source_build_name))
 
         doc_build_files = get_doc_build_files(config, ros_distro_name)
-        for doc_build_name in doc_build_files.keys():
-            generate_doc_maintenance_jobs(
-                args.config_url, ros_distro_name, doc_build_name)
-
-        generate_repos_status_page_jobs(
-            args.config_url, ros_distro_name)
+        for doc_build_name in sorted(doc_build_files.keys()):
+            add_task(
+                '%s %s doc-maintenance' % (ros_distro_name, doc_build_name),
+                get_doc_maintenance_jobs_cmd(
+                    config_url, ros_distro_name, doc_build_name))
+
+        add_task(
+            '%s repos-status-page' % ros_distro_name,
+            get_repos_status_page_jobs_cmd(config_url, ros_distro_name))
+    return tasks
+
+
+def run_tasks(tasks, max_workers, run_task=None):
+    """
+    Run the tasks concurrently while respecting their dependencies.
+
+    A task is started once all the tasks it depends on have succeeded.
+    Tasks depending on a failed task are skipped.
+
+    :param run_task: the function invoking a task and returning a tuple
+      of the return code, the output and the duration, by default
+      `_run_task` which invokes the script in a subprocess
+
+    :return: the names of the failed and skipped tasks
+    """
+    if run_task is None:
+        run_task = _run_task
+    pending_tasks = list(tasks)
+    succeeded_task_names = set([])
+    failed_task_names = []
+    durations = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending_tasks or running:
+            for task in list(pending_tasks):
+                if any(d in failed_task_names for d in task.dependencies):
+                    print("Skipping '%s' since a dependency failed" %
+                          task.name)
+                    pending_tasks.remove(task)
+                    failed_task_names.append(task.name)
+                    continue
+                if len(running) >= max_workers:
+                    break
+                if all(d in succeeded_task_names for d in task.dependencies):
+                    pending_tasks.remove(task)
+                    running[executor.submit(run_task, task)] = task
+            if not running:
+                if pending_tasks:
+                    raise RuntimeError(
+                        'Unresolvable task dependencies: ' +
+                        ', '.join([t.name for t in pending_tasks]))
+                break
+
+            done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                returncode, output, duration = future.result()
+                durations[task.name] = duration
+                print('')
+                print("Invoked '%s' (%s) in %.1fs" %
+                      (' '.join(task.cmd), task.name, duration))
+                print('')
+                if output:
+                    sys.stdout.write(output)
+                    print('')
+                if returncode:
+                    print("Task '%s' failed with return code %d" %
+                          (task.name, returncode), file=sys.stderr)
+                    failed_task_names.append(task.name)
+                else:
+                    succeeded_task_names.add(task.name)
+
+    print('Task durations:')
+    for name in sorted(durations.keys(), key=lambda n: -durations[n]):
+        print('  %6.1fs %s' % (durations[name], name))
+    return failed_task_names
+
+
+def _run_task(task):
+    start_time = time.time()
+    cmd = list(task.cmd)
+    basepath = os.path.dirname(__file__)
+    cmd[0] = os.path.join(basepath, cmd[0])
+    # the output is collected to not interleave the output of concurrent tasks
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output, _ = proc.communicate()
+    return \
+        proc.returncode, output.decode('utf-8', 'replace'), \
+        time.time() - start_time
 
 
-def generate_dashboard_job(config_url):
+def get_dashboard_job_cmd(config_url):
     cmd = [
         'misc/generate_dashboard_job.py',
         config_url,
     ]
-    _check_call(cmd)
+    return cmd
 
 
-def generate_rosdistro_cache_job(config_url, ros_distro_name):
+def get_rosdistro_cache_job_cmd(config_url, ros_distro_name):
     cmd = [
         'misc/generate_rosdistro_cache_job.py',
         config_url,
         ros_distro_name,
     ]
-    _check_call(cmd)
+    return cmd
 
 
-def generate_release_status_page_job(
+def get_release_status_page_job_cmd(
         config_url, ros_distro_name, release_build_name):
     cmd = [
         'status/generate_release_status_page_job.py',
@@ -96,19 +261,19 @@ def generate_release_status_page_job(
         ros_distro_name,
         release_build_name,
     ]
-    _check_call(cmd)
+    return cmd
 
 
-def generate_repos_status_page_jobs(config_url, ros_distro_name):
+def get_repos_status_page_jobs_cmd(config_url, ros_distro_name):
     cmd = [
         'status/generate_repos_status_page_job.py',
         config_url,
         ros_distro_name,
     ]
-    _check_call(cmd)
+    return cmd
 
 
-def generate_release_maintenance_jobs(
+def get_release_maintenance_jobs_cmd(
         config_url, ros_distro_name, release_build_name):
     cmd = [
         'release/generate_release_maintenance_jobs.py',
@@ -116,10 +281,10 @@ def generate_release_maintenance_jobs(
         ros_distro_name,
         release_build_name,
     ]
-    _check_call(cmd)
+    return cmd
 
 
-def generate_devel_maintenance_jobs(
+def get_devel_maintenance_jobs_cmd(
         config_url, ros_distro_name, source_build_name):
     cmd = [
         'devel/generate_devel_maintenance_jobs.py',
@@ -127,10 +292,10 @@ def generate_devel_maintenance_jobs(
         ros_distro_name,
         source_build_name,
     ]
-    _check_call(cmd)
+    return cmd
 
 
-def generate_doc_maintenance_jobs(
+def get_doc_maintenance_jobs_cmd(
         config_url, ros_distro_name, doc_build_name):
     cmd = [
         'doc/generate_doc_maintenance_jobs.py',
@@ -138,18 +303,43 @@ def generate_doc_maintenance_jobs(
         ros_distro_name,
         doc_build_name,
     ]
-    _check_call(cmd)
+    return cmd
 
 
-def _check_call(cmd):
-    print('')
-    print("Invoking '%s'" % ' '.join(cmd))
+def _run_task_in_process(task):
+    start_time = time.time()
     print('')
-    basepath = os.path.dirname(__file__)
-    cmd[0] = os.path.join(basepath, cmd[0])
-    subprocess.check_call(cmd)
+    print("Invoking '%s' in process" % ' '.join(task.cmd))
     print('')
+    main_function = _get_generator_main(task.cmd[0])
+    try:
+        returncode = main_function(task.cmd[1:]) or 0
+    except SystemExit as e:
+        # map the exit status like the interpreter does
+        returncode = 0 if e.code is None else (
+            e.code if isinstance(e.code, int) else 1)
+    except Exception:
+        traceback.print_exc()
+        returncode = 1
+    sys.stdout.flush()
+    return returncode, '', time.time() - start_time
+
+
+# the main functions of the generator scripts indexed by the relative path
+_generator_mains = {}
+
+
+def _get_generator_main(script):
+    if script not in _generator_mains:
+        path = os.path.join(os.path.dirname(__file__), script)
+        module_name = '_generate_all_jobs_' + \
+            os.path.splitext(script)[0].replace('/', '_')
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _generator_mains[script] = module.main
+    return _generator_mains[script]
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -3,9 +3,6 @@
 import argparse
 import sys
 
-from rosdistro import get_distribution_file
-from rosdistro import get_index
-
 from ros_buildfarm.argument import add_argument_arch
 from ros_buildfarm.argument import add_argument_build_name
 from ros_buildfarm.argument import add_argument_cache_dir
@@ -14,8 +11,10 @@ from ros_buildfarm.argument import add_argument_os_code_name
 from ros_buildfarm.argument import add_argument_rosdistro_name
 from ros_buildfarm.common import get_debian_package_name
 from ros_buildfarm.common import Target
+from ros_buildfarm.config import get_distribution_file
 from ros_buildfarm.config import get_index as get_config_index
 from ros_buildfarm.config import get_release_build_files
+from ros_buildfarm.config import get_rosdistro_index
 from ros_buildfarm.debian_repo import get_debian_repo_index
 
 
@@ -42,7 +41,7 @@ def check_sync_criteria(
         cache_dir):
     # fetch debian package list
     config = get_config_index(config_url)
-    index = get_index(config.rosdistro_index_url)
+    index = get_rosdistro_index(config.rosdistro_index_url)
     dist_file = get_distribution_file(index, rosdistro_name)
     build_files = get_release_build_files(config, rosdistro_name)
     build_file = build_files[release_build_name]
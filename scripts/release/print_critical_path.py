@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+
+from ros_buildfarm.argument import add_argument_build_name
+from ros_buildfarm.argument import add_argument_config_url
+from ros_buildfarm.argument import add_argument_rosdistro_name
+from ros_buildfarm.config import get_distribution_cache
+from ros_buildfarm.config import get_distribution_file
+from ros_buildfarm.config import get_index as get_config_index
+from ros_buildfarm.config import get_release_build_files
+from ros_buildfarm.config import get_rosdistro_index
+from ros_buildfarm.dependency_graph import get_release_dependency_graph
+from ros_buildfarm.release_job import get_binary_job_priorities
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Print the longest chain of released packages depending '
+                    'on each other and the packages unblocking the most '
+                    'downstream packages')
+    add_argument_config_url(parser)
+    add_argument_rosdistro_name(parser)
+    add_argument_build_name(parser, 'release')
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=20,
+        help='The number of packages with the longest downstream chains to '
+             'print (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    config = get_config_index(args.config_url)
+    build_files = get_release_build_files(config, args.rosdistro_name)
+    build_file = build_files[args.release_build_name]
+
+    index = get_rosdistro_index(config.rosdistro_index_url)
+    dist_file = get_distribution_file(index, args.rosdistro_name, build_file)
+    if not dist_file:
+        print('No distribution file matches the build file', file=sys.stderr)
+        return 1
+    dist_cache = get_distribution_cache(index, args.rosdistro_name)
+
+    pkg_names = dist_file.release_packages.keys()
+    dependency_graph = get_release_dependency_graph(dist_cache, pkg_names)
+    chain_lengths = dependency_graph.get_downstream_chain_lengths()
+    dependents_counts = dependency_graph.get_recursive_dependents_counts()
+    priorities = {}
+    if build_file.jenkins_binary_job_priority_range:
+        priorities = get_binary_job_priorities(build_file, dependency_graph)
+
+    critical_path = dependency_graph.get_critical_path()
+    print('Critical path with %d packages:' % len(critical_path))
+    for pkg_name in critical_path:
+        print('  - %s' % pkg_name)
+    print('Dependency levels: %d' % len(dependency_graph.get_levels()))
+
+    print('')
+    print('Packages with the longest downstream chains:')
+    ordered_pkg_names = sorted(
+        pkg_names,
+        key=lambda n: (-chain_lengths[n], -dependents_counts[n], n))
+    for pkg_name in ordered_pkg_names[:args.top]:
+        line = '  - %s: downstream chain %d, %d recursive dependents' % \
+            (pkg_name, chain_lengths[pkg_name], dependents_counts[pkg_name])
+        if pkg_name in priorities:
+            line += ', binary job priority %d' % priorities[pkg_name]
+        print(line)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
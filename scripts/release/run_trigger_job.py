@@ -7,6 +7,7 @@ import sys
 from ros_buildfarm.argument import add_argument_build_name
 from ros_buildfarm.argument import add_argument_cache_dir
 from ros_buildfarm.argument import add_argument_config_url
+from ros_buildfarm.argument import add_argument_dependency_order
 from ros_buildfarm.argument import \
     add_argument_distribution_repository_key_files
 from ros_buildfarm.argument import add_argument_distribution_repository_urls
@@ -33,6 +34,7 @@ def main(argv=sys.argv[1:]):
     add_argument_groovy_script(parser)
     add_argument_cache_dir(parser)
     add_argument_dockerfile_dir(parser)
+    add_argument_dependency_order(parser)
     args = parser.parse_args(argv)
 
     data = copy.deepcopy(args.__dict__)
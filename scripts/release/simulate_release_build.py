@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+
+from ros_buildfarm.argument import add_argument_build_name
+from ros_buildfarm.argument import add_argument_config_url
+from ros_buildfarm.argument import add_argument_rosdistro_name
+from ros_buildfarm.release_simulation import DEFAULT_DURATIONS
+from ros_buildfarm.release_simulation import get_simulated_release_jobs
+from ros_buildfarm.release_simulation import read_job_durations
+from ros_buildfarm.release_simulation import simulate_jobs
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Simulate a full rebuild of all release jobs to estimate '
+                    'the time it takes with a given number of executors')
+    add_argument_config_url(parser)
+    add_argument_rosdistro_name(parser)
+    add_argument_build_name(parser, 'release')
+    parser.add_argument(
+        '--executors',
+        nargs='+',
+        required=True,
+        metavar='LABEL=COUNT',
+        help='The number of executors for each node label used by the jobs '
+             "(e.g. 'buildslave=40 building_repository=1')")
+    parser.add_argument(
+        '--durations',
+        help='The path of a CSV file with the historical durations of jobs, '
+             "with the columns 'job_name' and 'duration' (in seconds)")
+    for kind in sorted(DEFAULT_DURATIONS.keys()):
+        parser.add_argument(
+            '--%s-duration' % kind,
+            type=float,
+            default=DEFAULT_DURATIONS[kind],
+            help='The duration in seconds of %s jobs without historical '
+                 'durations (default: %%(default)s)' % kind)
+    parser.add_argument(
+        '--sample-interval',
+        type=int,
+        default=600,
+        help='The interval in seconds between the reported queue depths '
+             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    executors = {}
+    for executor in args.executors:
+        label, _, count = executor.partition('=')
+        if not count.isdigit():
+            parser.error("Invalid executor count '%s'" % executor)
+        executors[label] = int(count)
+
+    durations = None
+    if args.durations:
+        durations = read_job_durations(args.durations)
+    default_durations = {
+        kind: getattr(args, '%s_duration' % kind)
+        for kind in DEFAULT_DURATIONS.keys()}
+
+    jobs = get_simulated_release_jobs(
+        args.config_url, args.rosdistro_name, args.release_build_name,
+        durations=durations, default_durations=default_durations)
+    print('Simulating %d jobs' % len(jobs))
+    if durations is not None:
+        print('  with historical durations for %d jobs' %
+              len([j for j in jobs if j.name in durations]))
+    try:
+        result = simulate_jobs(
+            jobs, executors, sample_interval=args.sample_interval)
+    except ValueError as e:
+        parser.error(str(e))
+
+    labels = sorted(result.executors.keys())
+    print('')
+    print('Queue depth and running jobs over time:')
+    widths = [max(8, len(label)) for label in labels]
+    print('  %8s %7s %s' % ('time', 'queued', ' '.join(
+        '%*s' % (width, label) for width, label in zip(widths, labels))))
+    for sample in result.samples:
+        print('  %8s %7d %s' % (
+            _format_duration(sample.time), sample.queued, ' '.join(
+                '%*d' % (width, sample.running[label])
+                for width, label in zip(widths, labels))))
+
+    print('')
+    print('Makespan: %s' % _format_duration(result.makespan))
+    print('Executor utilization:')
+    for label in labels:
+        utilization = 0
+        if result.makespan and result.executors[label]:
+            utilization = result.busy_times[label] / \
+                (result.makespan * result.executors[label])
+        print('  - %s: %d executors, %.1f%%' % (
+            label, result.executors[label], 100 * utilization))
+
+    if result.unfinished_job_names:
+        print('')
+        print('The following jobs never became buildable, e.g. because of '
+              'a dependency cycle:')
+        for job_name in result.unfinished_job_names:
+            print('  -', job_name)
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '%d:%02d:%02d' % (hours, minutes, seconds)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
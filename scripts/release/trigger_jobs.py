@@ -7,10 +7,12 @@ from ros_buildfarm.argument import add_argument_build_name
 from ros_buildfarm.argument import add_argument_cache_dir
 from ros_buildfarm.argument import add_argument_cause
 from ros_buildfarm.argument import add_argument_config_url
+from ros_buildfarm.argument import add_argument_dependency_order
 from ros_buildfarm.argument import add_argument_groovy_script
 from ros_buildfarm.argument import add_argument_missing_only
 from ros_buildfarm.argument import add_argument_rosdistro_name
 from ros_buildfarm.argument import add_argument_source_only
+from ros_buildfarm.argument import add_argument_wait_for_waves
 from ros_buildfarm.trigger_job import trigger_release_jobs
 
 
@@ -26,12 +28,19 @@ def main(argv=sys.argv[1:]):
     add_argument_cause(parser)
     add_argument_groovy_script(parser)
     add_argument_cache_dir(parser, '/tmp/debian_repo_cache')
+    add_argument_dependency_order(parser)
+    add_argument_wait_for_waves(parser)
     args = parser.parse_args(argv)
+    if args.wait_for_waves and args.groovy_script:
+        parser.error(
+            '--wait-for-waves can not be used together with --groovy-script')
 
     return trigger_release_jobs(
         args.config_url, args.rosdistro_name, args.release_build_name,
         args.missing_only, args.source_only, args.cache_dir, cause=args.cause,
-        groovy_script=args.groovy_script)
+        groovy_script=args.groovy_script,
+        dependency_order=args.dependency_order,
+        wait_for_waves=args.wait_for_waves)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark loading a large config index with many build files.
+
+Every measurement runs in a new process the same way as the scripts
+invoked by the jobs do: once without an on-disk cache, once with an empty
+cache directory and then with the pickled snapshots of the previous run.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+basepath = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+LOAD_CONFIG = """
+import sys
+import time
+start = time.time()
+from ros_buildfarm.config import get_index
+from ros_buildfarm.config import get_release_build_files
+from ros_buildfarm.config import get_source_build_files
+index = get_index(sys.argv[1])
+for dist_name in sorted(index.distributions):
+    get_release_build_files(index, dist_name)
+    get_source_build_files(index, dist_name)
+print('%.3f' % (time.time() - start))
+"""
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Benchmark loading a large config index')
+    parser.add_argument(
+        '--distributions', type=int, default=5,
+        help='The number of distributions in the index')
+    parser.add_argument(
+        '--build-files', type=int, default=40,
+        help='The number of release and source build files per '
+             'distribution')
+    parser.add_argument(
+        '--packages', type=int, default=1000,
+        help='The number of packages whitelisted in each release build file')
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='The number of runs using the pickled snapshots')
+    args = parser.parse_args(argv)
+
+    config_dir = tempfile.mkdtemp(prefix='benchmark_config_')
+    cache_dir = tempfile.mkdtemp(prefix='benchmark_config_cache_')
+    try:
+        write_config(
+            config_dir, args.distributions, args.build_files, args.packages)
+        url = 'file://' + os.path.join(config_dir, 'index.yaml')
+        print('no cache: %ss' % load_config(url, None))
+        print('empty cache: %ss' % load_config(url, cache_dir))
+        durations = [load_config(url, cache_dir) for _ in range(args.repeat)]
+        print('pickled snapshots: %ss' % min(durations))
+    finally:
+        shutil.rmtree(config_dir)
+        shutil.rmtree(cache_dir)
+
+
+def write_config(config_dir, distribution_count, build_file_count,
+                 package_count):
+    lines = ['distributions:']
+    for i in range(distribution_count):
+        dist_name = 'dist%d' % i
+        lines.append('  %s:' % dist_name)
+        for type_, prefix in [
+            ('release_builds', 'release'),
+            ('source_builds', 'source'),
+        ]:
+            lines.append('    %s:' % type_)
+            for j in range(build_file_count):
+                filename = '%s_%s%d.yaml' % (dist_name, prefix, j)
+                lines.append('      %s%d: %s' % (prefix, j, filename))
+        for j in range(build_file_count):
+            write_build_file(
+                config_dir, '%s_release%d.yaml' % (dist_name, j), [
+                    'jenkins_binary_job_priority: %d' % j,
+                    'package_whitelist:',
+                ] + ['- pkg_%d' % k for k in range(package_count)] + [
+                    'target_repository: http://repo.example.com/ubuntu',
+                    'type: release-build',
+                    'upload_credential_id: credential',
+                    'version: 2',
+                ])
+            write_build_file(
+                config_dir, '%s_source%d.yaml' % (dist_name, j), [
+                    'jenkins_commit_job_priority: %d' % j,
+                    'type: source-build',
+                    'version: 3',
+                ])
+    lines += [
+        'jenkins_url: http://jenkins.example.com',
+        'prerequisites: {}',
+        'rosdistro_index_url: http://example.com/index.yaml',
+        'type: buildfarm',
+        'version: 1',
+    ]
+    with open(os.path.join(config_dir, 'index.yaml'), 'w') as h:
+        h.write('\n'.join(lines) + '\n')
+
+
+def write_build_file(config_dir, filename, lines):
+    lines = lines + ['targets:', '  ubuntu:']
+    for os_code_name in ['xenial', 'bionic']:
+        lines += ['    %s:' % os_code_name, '      amd64: {}']
+    with open(os.path.join(config_dir, filename), 'w') as h:
+        h.write('\n'.join(lines) + '\n')
+
+
+def load_config(url, cache_dir):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [basepath] + [p for p in [env.get('PYTHONPATH')] if p])
+    env.pop('ROS_BUILDFARM_CONFIG_CACHE_DIR', None)
+    if cache_dir:
+        env['ROS_BUILDFARM_CONFIG_CACHE_DIR'] = cache_dir
+    return subprocess.check_output(
+        [sys.executable, '-c', LOAD_CONFIG, url], env=env).decode().strip()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
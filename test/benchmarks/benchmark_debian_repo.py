@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark parsing a synthetic `Packages` index.
+
+The streaming parser `get_package_versions` is compared with the previous
+implementation which read and split the whole index in memory.
+Both the duration and the peak of the allocated memory are reported,
+the latter being measured in a separate run.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+
+from ros_buildfarm.debian_repo import get_package_versions  # noqa: E402
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Benchmark parsing a synthetic Packages index')
+    parser.add_argument(
+        '--count', type=int, default=100000,
+        help='The number of package stanzas in the index')
+    args = parser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp(prefix='benchmark_debian_repo_')
+    try:
+        filename = os.path.join(tmpdir, 'Packages')
+        write_index(filename, args.count)
+        results = []
+        for name, parse in [
+            ('previous', parse_index_in_memory),
+            ('streaming', parse_index_streaming),
+        ]:
+            start = time.time()
+            results.append(parse(filename))
+            duration = time.time() - start
+            # tracing the allocations slows down the parsing considerably
+            tracemalloc.start()
+            parse(filename)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('%s: %d stanzas in %.2fs, %.1f MB peak memory' % (
+                name, args.count, duration, peak / 1e6))
+        assert results[0] == results[1]
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_index(filename, count):
+    with open(filename, 'w', encoding='utf8') as h:
+        for i in range(count):
+            h.write(
+                'Package: ros-kinetic-pkg%d\n' % i +
+                'Version: 1.2.%d-0xenial-20180101-000000-0800\n' % i +
+                'Architecture: amd64\n'
+                'Maintainer: Maintainer <maintainer@example.com>\n'
+                'Installed-Size: 1234\n'
+                'Depends: libc6 (>= 2.14), ros-kinetic-catkin\n'
+                'Filename: pool/main/r/ros-kinetic-pkg%d/'
+                'ros-kinetic-pkg%d_1.2.%d-0xenial_amd64.deb\n' % (i, i, i) +
+                'Size: 56789\n'
+                'SHA256: %064x\n' % i +
+                'Description: The pkg%d package\n' % i +
+                ' A longer description\n'
+                ' .\n'
+                ' spanning multiple lines.\n'
+                '\n')
+
+
+def parse_index_in_memory(filename):
+    with open(filename, 'rb') as f:
+        blocks = f.read().decode('utf8').split('\n\n')
+    blocks = [b.splitlines() for b in blocks if b]
+
+    package_versions = {}
+    for lines in blocks:
+        prefix = 'Package: '
+        assert lines[0].startswith(prefix)
+        debian_pkg_name = lines[0][len(prefix):]
+
+        prefix = 'Version: '
+        versions = [
+            line[len(prefix):] for line in lines if line.startswith(prefix)]
+        version = versions[0] if len(versions) == 1 else None
+
+        package_versions[debian_pkg_name] = version
+    return package_versions
+
+
+def parse_index_streaming(filename):
+    with open(filename, 'r', encoding='utf8') as f:
+        return get_package_versions(f)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark comparing all pairs of versions of an index.
+
+The versions are read from a `Packages` file if one is passed, otherwise
+versions similar to the ones of a ROS distribution are generated.
+Optionally the much slower comparison based on `LooseVersion` which was
+used before is measured as well.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+
+from ros_buildfarm.debian_repo import get_package_versions  # noqa: E402
+from ros_buildfarm.debian_version import compare_debian_versions  # noqa: E402
+from ros_buildfarm.debian_version import get_debian_version_key  # noqa: E402
+
+try:
+    from distutils.version import LooseVersion
+except ImportError:
+    LooseVersion = None
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Benchmark comparing all pairs of versions of an index')
+    parser.add_argument(
+        '--index', help='The path of a decompressed Packages file')
+    parser.add_argument(
+        '--count', type=int, default=3000,
+        help='The number of versions to generate if no index is passed')
+    parser.add_argument(
+        '--loose-version', action='store_true',
+        help='Also measure the comparison based on LooseVersion')
+    args = parser.parse_args(argv)
+    if args.loose_version and LooseVersion is None:
+        parser.error('distutils is not available')
+
+    if args.index:
+        with open(args.index, 'r', encoding='utf8') as f:
+            versions = [v for v in get_package_versions(f).values() if v]
+    else:
+        versions = generate_versions(args.count)
+
+    comparisons = [('compare_debian_versions', compare_debian_versions)]
+    if args.loose_version:
+        comparisons.append(('LooseVersion', compare_loose_versions))
+    for name, compare in comparisons:
+        get_debian_version_key.cache_clear()
+        start = time.time()
+        for version in versions:
+            for other_version in versions:
+                compare(version, other_version)
+        duration = time.time() - start
+        count = len(versions) ** 2
+        print('%s: %d comparisons in %.2fs (%.2f us each)' % (
+            name, count, duration, duration / count * 1e6))
+
+
+def generate_versions(count):
+    rng = random.Random(0)
+    versions = []
+    for i in range(count):
+        version = '%d.%d.%d' % (
+            rng.randint(0, 2), rng.randint(0, 15), rng.randint(0, 30))
+        if rng.random() < 0.05:
+            version = '%d:%s' % (rng.randint(1, 2), version)
+        if rng.random() < 0.05:
+            version += '~rc%d' % rng.randint(1, 3)
+        version += '-%dxenial' % rng.randint(0, 2)
+        if rng.random() < 0.5:
+            version += '-20180%d%02d-%06d-0800' % (
+                rng.randint(1, 9), rng.randint(1, 28), rng.randint(0, 235959))
+        versions.append(version)
+    return versions
+
+
+def compare_loose_versions(version, other_version):
+    try:
+        return LooseVersion(version) > LooseVersion(other_version)
+    except TypeError:
+        # the previous code compared the individual parts in this case
+        return version > other_version
+
+
+if __name__ == '__main__':
+    sys.exit(main())
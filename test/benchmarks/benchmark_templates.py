@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark expanding the binarydeb job template.
+
+The template is expanded with and without the cache of parsed templates
+and the interpreter pool, the latter being disabled by registering a hook.
+Since parsing dominates without the cache it is measured with fewer
+expansions by default.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+basepath = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(basepath, 'test'))
+sys.path.insert(0, basepath)
+
+from em import Hook  # noqa: E402
+from ros_buildfarm import templates  # noqa: E402
+from ros_buildfarm.templates import expand_template  # noqa: E402
+
+from test_templates import BINARYDEB_DATA  # noqa: E402
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        description='Benchmark expanding the binarydeb job template')
+    parser.add_argument(
+        '--count', type=int, default=10000,
+        help='The number of cached expansions')
+    parser.add_argument(
+        '--uncached-count', type=int, default=100,
+        help='The number of uncached expansions')
+    args = parser.parse_args(argv)
+
+    for name, template_hooks, count in [
+        ('cached', None, args.count),
+        ('uncached', [Hook()], args.uncached_count),
+    ]:
+        templates.template_hooks = template_hooks
+        start = time.time()
+        for i in range(count):
+            data = dict(BINARYDEB_DATA)
+            data['pkg_name'] = 'pkg%d' % i
+            expand_template('release/binarydeb_job.xml.em', data)
+        duration = time.time() - start
+        print('%s: %d expansions in %.2fs (%.3f ms each)' % (
+            name, count, duration, duration / count * 1000))
+    templates.template_hooks = None
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import difflib
+import gzip
+import hashlib
+from http.server import HTTPServer
+from http.server import SimpleHTTPRequestHandler
+import os
+import shutil
+import tempfile
+import threading
+
+
+class DebianRepoFixture(object):
+
+    """
+    A local stand-in for a Debian repository served over HTTP.
+
+    Every published version of the `Packages` index of a single target is
+    accompanied by a pdiff from the previous version, like the indexes of
+    repositories managed by reprepro with pdiffs enabled.
+    With `pdiffs` disabled only the index itself is published.
+    """
+
+    def __init__(self, os_code_name='xenial', arch='amd64', pdiffs=True):
+        self.basepath = tempfile.mkdtemp(prefix='debian_repo_')
+        self.index_path = os.path.join(
+            'dists', os_code_name, 'main', 'binary-%s' % arch)
+        self.pdiffs = pdiffs
+        self.requested_paths = []
+        self._versions = []
+        self._history = []
+
+        fixture = self
+
+        class RequestHandler(SimpleHTTPRequestHandler):
+
+            def translate_path(self, path):
+                fixture.requested_paths.append(path)
+                return os.path.join(fixture.basepath, path.lstrip('/'))
+
+            def log_message(self, *args):
+                pass
+
+        self._server = HTTPServer(('127.0.0.1', 0), RequestHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        self.baseurl = 'http://127.0.0.1:%d' % self._server.server_port
+        self.url = '%s/%s/Packages.gz' % (self.baseurl, self.index_path)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self.basepath)
+
+    def publish(self, content):
+        """Publish a new version of the index together with a pdiff."""
+        path = os.path.join(self.basepath, self.index_path)
+        diff_path = os.path.join(path, 'Packages.diff')
+        if not os.path.exists(diff_path):
+            os.makedirs(diff_path)
+
+        if self._versions and self.pdiffs:
+            previous = self._versions[-1]
+            patch_name = 'T-%d' % len(self._versions)
+            with gzip.open(os.path.join(diff_path, patch_name + '.gz'),
+                           'wb') as h:
+                h.write(get_ed_patch(previous, content).encode('utf8'))
+            self._history.append((_get_sha256(previous), patch_name))
+        self._versions.append(content)
+
+        filename = os.path.join(path, 'Packages.gz')
+        with gzip.open(filename, 'wb') as h:
+            h.write(content.encode('utf8'))
+        # distinct modification times for conditional requests
+        mtime = 1000000000 + 100 * len(self._versions)
+        os.utime(filename, (mtime, mtime))
+
+        if not self.pdiffs:
+            return
+        lines = ['SHA256-Current: %s %d' % (
+            _get_sha256(content), len(content.encode('utf8')))]
+        lines.append('SHA256-History:')
+        for checksum, patch_name in self._history:
+            lines.append(' %s 0 %s' % (checksum, patch_name))
+        with open(os.path.join(diff_path, 'Index'), 'w') as h:
+            h.write('\n'.join(lines) + '\n')
+
+    def get_patch_filename(self, version):
+        """Get the filename of the pdiff from the passed version."""
+        return os.path.join(
+            self.basepath, self.index_path, 'Packages.diff',
+            'T-%d.gz' % version)
+
+
+def get_ed_patch(old, new):
+    """Get a patch in the format of `diff --ed` between two strings."""
+    old_lines = old.splitlines(True)
+    new_lines = new.splitlines(True)
+    matcher = difflib.SequenceMatcher(a=old_lines, b=new_lines)
+    commands = []
+    # the commands are ordered from the end of the file to the beginning
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == 'equal':
+            continue
+        lines = '%d' % (i1 + 1) if i2 - i1 == 1 else '%d,%d' % (i1 + 1, i2)
+        if tag == 'insert':
+            commands.append('%da\n' % i1)
+        elif tag == 'replace':
+            commands.append('%sc\n' % lines)
+        else:
+            commands.append('%sd\n' % lines)
+        if tag != 'delete':
+            commands += new_lines[j1:j2]
+            commands.append('.\n')
+    return ''.join(commands)
+
+
+def get_packages_index(packages):
+    """Get the content of a `Packages` file for a dict of versions."""
+    return ''.join(
+        'Package: %s\nVersion: %s\nArchitecture: amd64\n\n' % (name, version)
+        for name, version in sorted(packages.items()))
+
+
+def _get_sha256(content):
+    return hashlib.sha256(content.encode('utf8')).hexdigest()
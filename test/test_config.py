@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+
+from ros_buildfarm import config
+from ros_buildfarm.config import clear_cache
+from ros_buildfarm.config import get_index
+from ros_buildfarm.config import get_release_build_files
+
+INDEX = """\
+distributions:
+  kinetic:
+    release_builds:
+      default: release.yaml
+jenkins_url: http://jenkins.example.com
+prerequisites: {}
+rosdistro_index_url: http://example.com/index.yaml
+type: buildfarm
+version: 1
+"""
+
+RELEASE_BUILD_FILE = """\
+jenkins_binary_job_priority: %d
+target_repository: http://repo.example.com/ubuntu
+targets:
+  ubuntu:
+    xenial:
+      amd64: {}
+type: release-build
+upload_credential_id: credential
+version: 2
+"""
+
+
+def test_snapshot_is_reused():
+    with _ConfigAndCache() as config_dir:
+        _write(config_dir, 'release.yaml', RELEASE_BUILD_FILE % 100)
+        assert _get_priority(config_dir) == 100
+
+        clear_cache()
+        with _CountingLoadYaml() as load_yaml:
+            assert _get_priority(config_dir) == 100
+        assert load_yaml.count == 0
+
+
+def test_changed_build_file_invalidates_snapshot():
+    with _ConfigAndCache() as config_dir:
+        _write(config_dir, 'release.yaml', RELEASE_BUILD_FILE % 100)
+        assert _get_priority(config_dir) == 100
+
+        _write(config_dir, 'release.yaml', RELEASE_BUILD_FILE % 200)
+        clear_cache()
+        with _CountingLoadYaml() as load_yaml:
+            assert _get_priority(config_dir) == 200
+        # only the changed build file is parsed again
+        assert load_yaml.count == 1
+
+
+class _ConfigAndCache(object):
+
+    def __enter__(self):
+        self.config_dir = tempfile.mkdtemp(prefix='config_')
+        self.cache_dir = tempfile.mkdtemp(prefix='config_cache_')
+        self.environ = os.environ.get(config.CACHE_DIR_ENVIRONMENT_VARIABLE)
+        os.environ[config.CACHE_DIR_ENVIRONMENT_VARIABLE] = self.cache_dir
+        _write(self.config_dir, 'index.yaml', INDEX)
+        clear_cache()
+        return self.config_dir
+
+    def __exit__(self, *args):
+        clear_cache()
+        if self.environ is None:
+            del os.environ[config.CACHE_DIR_ENVIRONMENT_VARIABLE]
+        else:
+            os.environ[config.CACHE_DIR_ENVIRONMENT_VARIABLE] = self.environ
+        shutil.rmtree(self.config_dir)
+        shutil.rmtree(self.cache_dir)
+
+
+class _CountingLoadYaml(object):
+
+    def __enter__(self):
+        self.count = 0
+        self.load_yaml = config.load_yaml
+
+        def load_yaml(stream):
+            self.count += 1
+            return self.load_yaml(stream)
+        config.load_yaml = load_yaml
+        return self
+
+    def __exit__(self, *args):
+        config.load_yaml = self.load_yaml
+
+
+def _get_priority(config_dir):
+    index = get_index('file://' + os.path.join(config_dir, 'index.yaml'))
+    build_files = get_release_build_files(index, 'kinetic')
+    return build_files['default'].jenkins_binary_job_priority
+
+
+def _write(config_dir, filename, content):
+    with open(os.path.join(config_dir, filename), 'w') as h:
+        h.write(content)
@@ -0,0 +1,184 @@
+import os
+import shutil
+import tempfile
+
+from ros_buildfarm.debian_repo import apply_ed_patch
+from ros_buildfarm.debian_repo import get_package_versions
+from ros_buildfarm.debian_repo import update_cached_index
+
+from debian_repo_fixture import DebianRepoFixture
+from debian_repo_fixture import get_ed_patch
+from debian_repo_fixture import get_packages_index
+
+VERSIONS = [
+    {'ros-foo': '1.0.0-0xenial', 'ros-bar': '0.1.0-0xenial'},
+    {'ros-foo': '1.0.1-0xenial', 'ros-bar': '0.1.0-0xenial',
+     'ros-baz': '2.0.0-0xenial'},
+    {'ros-foo': '1.0.1-0xenial', 'ros-baz': '2.0.1-0xenial',
+     'ros-qux': '0.0.1-0xenial'},
+]
+
+
+def test_apply_ed_patch():
+    old = 'a\nb\nc\nd\ne\n'
+    new = 'x\na\nc\nD\nE\ne\nf\n'
+    lines = old.splitlines(True)
+    apply_ed_patch(lines, get_ed_patch(old, new).splitlines(True))
+    assert ''.join(lines) == new
+
+
+def test_apply_ed_patch_unsupported_command():
+    try:
+        apply_ed_patch(['a\n'], ['1s/a/b/\n'])
+    except ValueError:
+        pass
+    else:
+        assert False, 'ValueError not raised'
+
+
+def test_package_versions():
+    lines = get_packages_index(VERSIONS[0]).splitlines(True)
+    assert get_package_versions(lines) == VERSIONS[0]
+
+
+def test_package_versions_multiple_versions():
+    lines = [
+        'Package: ros-foo\n',
+        'Version: 1.0.0-0xenial\n',
+        'Version: 1.0.1-0xenial\n',
+        '\n',
+        'Package: ros-bar\n',
+        'Architecture: amd64\n',
+        '\n',
+    ]
+    assert get_package_versions(lines) == {'ros-foo': None, 'ros-bar': None}
+
+
+def test_package_versions_without_trailing_blank_line():
+    lines = [
+        'Package: ros-foo\n',
+        'Version: 1.0.0-0xenial\n',
+        '\n',
+        'Package: ros-bar\n',
+        'Version: 0.1.0-0xenial',
+    ]
+    assert get_package_versions(lines) == {
+        'ros-foo': '1.0.0-0xenial', 'ros-bar': '0.1.0-0xenial'}
+
+
+def test_package_versions_continuation_lines():
+    lines = [
+        'Package: ros-foo\n',
+        'Description: short description\n',
+        ' Package: not a field\n',
+        ' .\n',
+        ' Version: not a field either\n',
+        'Version: 1.0.0-0xenial\n',
+        '\n',
+    ]
+    assert get_package_versions(lines) == {'ros-foo': '1.0.0-0xenial'}
+
+
+def test_chained_pdiffs():
+    with _RepoAndCache() as (repo, cache_filename):
+        repo.publish(get_packages_index(VERSIONS[0]))
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        repo.publish(get_packages_index(VERSIONS[1]))
+        repo.publish(get_packages_index(VERSIONS[2]))
+
+        del repo.requested_paths[:]
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        _assert_cached_index(cache_filename, VERSIONS[2])
+        # the index itself has not been downloaded again
+        assert not [
+            p for p in repo.requested_paths if p.endswith('/Packages.gz')]
+        assert len([p for p in repo.requested_paths if '/T-' in p]) == 2
+
+
+def test_current_index_is_not_patched():
+    with _RepoAndCache() as (repo, cache_filename):
+        repo.publish(get_packages_index(VERSIONS[0]))
+        repo.publish(get_packages_index(VERSIONS[1]))
+        update_cached_index(repo.url, cache_filename, max_age=0)
+
+        del repo.requested_paths[:]
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        _assert_cached_index(cache_filename, VERSIONS[1])
+        assert repo.requested_paths == [
+            '/%s/Packages.diff/Index' % repo.index_path]
+
+
+def test_broken_chain_falls_back_to_download():
+    with _RepoAndCache() as (repo, cache_filename):
+        repo.publish(get_packages_index(VERSIONS[0]))
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        repo.publish(get_packages_index(VERSIONS[1]))
+        repo.publish(get_packages_index(VERSIONS[2]))
+        os.remove(repo.get_patch_filename(2))
+
+        del repo.requested_paths[:]
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        _assert_cached_index(cache_filename, VERSIONS[2])
+        assert [p for p in repo.requested_paths if p.endswith('/Packages.gz')]
+
+
+def test_corrupt_patch_falls_back_to_download():
+    with _RepoAndCache() as (repo, cache_filename):
+        repo.publish(get_packages_index(VERSIONS[0]))
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        repo.publish(get_packages_index(VERSIONS[1]))
+        with open(repo.get_patch_filename(1), 'wb') as h:
+            h.write(b'not gzipped')
+
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        _assert_cached_index(cache_filename, VERSIONS[1])
+
+
+def test_corrupt_cache_falls_back_to_download():
+    with _RepoAndCache() as (repo, cache_filename):
+        repo.publish(get_packages_index(VERSIONS[0]))
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        repo.publish(get_packages_index(VERSIONS[1]))
+        with open(cache_filename, 'a') as h:
+            h.write('Package: garbage\n')
+
+        del repo.requested_paths[:]
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        _assert_cached_index(cache_filename, VERSIONS[1])
+        assert not [p for p in repo.requested_paths if '/T-' in p]
+        assert [p for p in repo.requested_paths if p.endswith('/Packages.gz')]
+
+
+def test_missing_pdiffs_are_not_requested_again():
+    with _RepoAndCache(pdiffs=False) as (repo, cache_filename):
+        repo.publish(get_packages_index(VERSIONS[0]))
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        repo.publish(get_packages_index(VERSIONS[1]))
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        _assert_cached_index(cache_filename, VERSIONS[1])
+        repo.publish(get_packages_index(VERSIONS[2]))
+
+        del repo.requested_paths[:]
+        update_cached_index(repo.url, cache_filename, max_age=0)
+        _assert_cached_index(cache_filename, VERSIONS[2])
+        assert not [p for p in repo.requested_paths if '.diff/' in p]
+
+
+class _RepoAndCache(object):
+
+    def __init__(self, pdiffs=True):
+        self.pdiffs = pdiffs
+
+    def __enter__(self):
+        self.repo = DebianRepoFixture(pdiffs=self.pdiffs)
+        self.cache_dir = tempfile.mkdtemp(prefix='debian_repo_cache_')
+        return self.repo, os.path.join(self.cache_dir, 'index')
+
+    def __exit__(self, *args):
+        self.repo.close()
+        shutil.rmtree(self.cache_dir)
+
+
+def _assert_cached_index(cache_filename, packages):
+    with open(cache_filename, 'rb') as h:
+        assert h.read() == get_packages_index(packages).encode('utf8')
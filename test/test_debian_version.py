@@ -0,0 +1,54 @@
+from ros_buildfarm.debian_version import compare_debian_versions
+from ros_buildfarm.debian_version import get_debian_version_key
+
+
+def test_epoch():
+    _assert_order('2.0', '1:0.1')
+    _assert_order('1:2.0', '2:1.0')
+    _assert_equal('1.0', '0:1.0')
+
+
+def test_tilde():
+    _assert_order('1.0~rc1', '1.0')
+    _assert_order('1.0~rc1', '1.0~rc2')
+    _assert_order('1.0~~', '1.0~')
+    _assert_order('1.0~', '1.0')
+    _assert_order('1.0~rc1-1', '1.0-0')
+    _assert_order('1.0-1~bpo1', '1.0-1')
+
+
+def test_revision():
+    _assert_equal('1.0', '1.0-0')
+    _assert_equal('1.0', '1.0-')
+    _assert_order('1.0', '1.0-1')
+    _assert_order('1.0-1', '1.0-1ubuntu1')
+    _assert_order('1.0-9', '1.0-10')
+    # only the last hyphen separates the revision
+    _assert_order('1.0-1-1', '1.0-1-2')
+    _assert_order('1.0-1-1', '1.0.1-1')
+
+
+def test_digit_and_non_digit_runs():
+    _assert_order('1.2', '1.10')
+    _assert_equal('1.2', '1.002')
+    _assert_order('1.0', '1.0a')
+    _assert_order('1.2a', '1.2.1')
+    _assert_order('1.0a', '1.0+')
+    _assert_order('1.0a', '1.0b')
+    _assert_order('1.2.3-0xenial', '1.2.3-0xenial-20180101-000000-0800')
+
+
+def test_sorting():
+    versions = ['1:0.1', '1.0-1', '1.0~rc1', '1.0', '1.0.1', '0.9-3']
+    assert sorted(versions, key=get_debian_version_key) == [
+        '0.9-3', '1.0~rc1', '1.0', '1.0-1', '1.0.1', '1:0.1']
+
+
+def _assert_order(lower, higher):
+    assert compare_debian_versions(lower, higher) < 0
+    assert compare_debian_versions(higher, lower) > 0
+
+
+def _assert_equal(version, other_version):
+    assert compare_debian_versions(version, other_version) == 0
+    assert compare_debian_versions(other_version, version) == 0
@@ -0,0 +1,23 @@
+from ros_buildfarm.dependency_graph import DependencyGraph
+
+# a depends on b and c, b depends on c
+DEPENDENCIES = {'a': ['b', 'c'], 'b': ['c'], 'c': []}
+
+
+def test_reduced_dependencies():
+    graph = DependencyGraph(DEPENDENCIES)
+    assert graph.get_reduced_dependencies('a') == set(['b'])
+    assert graph.get_reduced_dependencies('b') == set(['c'])
+    assert graph.get_reduced_dependencies('c') == set()
+
+
+def test_reduced_dependencies_of_subgraph():
+    graph = DependencyGraph(DEPENDENCIES).get_subgraph(['a', 'c'])
+    assert graph.names == ['a', 'c']
+    # the dependency on c is not implied without b
+    assert graph.get_reduced_dependencies('a') == set(['c'])
+
+
+def test_reduced_dependencies_with_cycle():
+    graph = DependencyGraph({'a': ['b', 'c'], 'b': ['a', 'c'], 'c': []})
+    assert graph.get_reduced_dependencies('a') == set(['b', 'c'])
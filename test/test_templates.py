@@ -0,0 +1,79 @@
+from collections import namedtuple
+import threading
+
+from em import Hook
+from ros_buildfarm import templates
+from ros_buildfarm.templates import expand_template
+
+BINARYDEB_DATA = {
+    'github_url': 'https://github.com/ros-gbp/foo-release',
+    'job_priority': 5,
+    'node_label': 'buildslave',
+    'disabled': False,
+    'upstream_projects': ['Kbin_uX64__bar__ubuntu_xenial_amd64__binary'],
+    'ros_buildfarm_repository': namedtuple('Repository', 'url version')(
+        'https://github.com/ros-infrastructure/ros_buildfarm.git', 'master'),
+    'script_generating_key_files': ['echo "key" > key.asc'],
+    'rosdistro_index_url': 'http://example.com/index.yaml',
+    'rosdistro_name': 'kinetic',
+    'release_build_name': 'default',
+    'pkg_name': 'foo',
+    'os_name': 'ubuntu',
+    'os_code_name': 'xenial',
+    'arch': 'amd64',
+    'repository_args': ['http://example.com/ubuntu'],
+    'append_timestamp': False,
+    'binarydeb_files': ['binarydeb/*.changes', 'binarydeb/*.deb'],
+    'import_package_job_name': 'Kin_import-package',
+    'debian_package_name': 'ros-kinetic-foo',
+    'child_projects': ['Kbin_uX64__sync-packages-to-testing_xenial_amd64'],
+    'notify_emails': ['user@example.com'],
+    'maintainer_emails': set(['maintainer@example.com']),
+    'notify_maintainers': True,
+    'timeout_minutes': 120,
+    'credential_id': 'credential',
+}
+
+DASHBOARD_DATA = {'notification_emails': ['user@example.com']}
+
+
+def test_cached_expansion_matches_uncached():
+    for template_name, data in [
+        ('release/binarydeb_job.xml.em', BINARYDEB_DATA),
+        ('misc/dashboard_job.xml.em', DASHBOARD_DATA),
+    ]:
+        cached = [_expand(template_name, data) for _ in range(2)]
+        # hooks disable the cache of parsed templates and the pool
+        templates.template_hooks = [Hook()]
+        try:
+            uncached = _expand(template_name, data)
+        finally:
+            templates.template_hooks = None
+        assert cached == [uncached, uncached]
+
+
+def test_concurrent_print_is_not_expanded():
+    expected = _expand('misc/dashboard_job.xml.em', DASHBOARD_DATA)
+
+    stop = threading.Event()
+
+    def print_repeatedly():
+        while not stop.is_set():
+            print('Output of another thread')
+
+    thread = threading.Thread(target=print_repeatedly)
+    thread.start()
+    try:
+        for _ in range(50):
+            assert _expand(
+                'misc/dashboard_job.xml.em', DASHBOARD_DATA) == expected
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _expand(template_name, data):
+    content = expand_template(template_name, data)
+    # ignore the timestamp of the expansion
+    return [
+        line for line in content.splitlines() if 'Generated at' not in line]